@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Asyncio game manager for many concurrent AI games.
+
+AiPlayerInterface waits for each move with a blocking readline and starts
+a threading.Timer per move to kill a slow AI, so one manager plays one
+game at a time. Here the AI processes are started with
+asyncio.create_subprocess_exec and read through non-blocking pipes, and
+asyncio.wait_for enforces the move timeout, so a single thread can drive
+hundreds of games at once. The protocol is the one of othello_game (see
+protocol.py). Every game ends with FINAL to both AIs, also when one of
+them timed out, and an AI that exits, stops answering, sends a malformed
+reply or plays an illegal move forfeits the game.
+
+Usage: python async_manager.py randy_ai.py randy_ai.py -b 6 -n 200 --concurrency 100
+"""
+import argparse
+import asyncio
+import os
+import shlex
+import sys
+import threading
+import time
+
+from othello_game import AiPlayerInterface, AiTimeoutError, InvalidMoveError, OthelloGameManager, play_game
+from othello_shared import get_score
+from protocol import parse_introduction, choose_protocol, color_line, encode_board, NEWGAME
+
+
+class AsyncAiPlayer(object):
+    """
+    AI process driven through asyncio pipes; create one with start_ai.
+    The coroutines mirror the methods of AiPlayerInterface.
+    """
+
+    def __init__(self, process, name, color, protocol, persistent, timeout):
+        self.process = process
+        self.name = name
+        self.color = color
+        self.protocol = protocol
+        self.persistent = persistent
+        self.timeout = timeout
+        self.timed_out = False
+
+    async def send(self, *lines):
+        self.process.stdin.write("".join(line + "\n" for line in lines).encode("ASCII"))
+        await self.process.stdin.drain()
+
+    async def receive(self):
+        """
+        Return the next line of the AI, killing it and raising
+        AiTimeoutError if it takes longer than the timeout or has exited.
+        """
+        try:
+            line = await asyncio.wait_for(self.process.stdout.readline(), self.timeout)
+        except asyncio.TimeoutError:
+            line = b""
+        if not line:
+            self.timed_out = True
+            await self.close()
+            raise AiTimeoutError("{} timed out".format(self.name))
+        return line.decode("ASCII")
+
+    async def get_move(self, manager):
+        dark_score, light_score = get_score(manager.board)
+        try:
+            await self.send("SCORE {} {}".format(dark_score, light_score),
+                            encode_board(manager.board, self.protocol))
+        except ConnectionError:
+            self.timed_out = True
+            raise AiTimeoutError("{} exited".format(self.name))
+        i_s, j_s = (await self.receive()).strip().split()
+        return int(i_s), int(j_s)
+
+    async def kill(self, manager):
+        """
+        Send FINAL, then keep a persistent AI for the next game or stop it.
+        """
+        dark_score, light_score = get_score(manager.board)
+        try:
+            await self.send("FINAL {} {}".format(dark_score, light_score))
+            if self.persistent and not self.timed_out:
+                await self.receive()    # The AI acknowledges FINAL
+                return
+        except (ConnectionError, AiTimeoutError):
+            pass
+        await self.close()
+
+    async def new_game(self, color):
+        """
+        Returns:
+            reused (bool): False if the AI process cannot play another game
+        """
+        if not self.persistent or self.timed_out or self.process.returncode is not None:
+            return False
+        try:
+            await self.send("NEWGAME {}".format(color))
+        except ConnectionError:
+            return False
+        self.color = color
+        return True
+
+    async def close(self):
+        if self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+        await self.process.wait()
+
+
+def use_pidfd_watcher():
+    """
+    Before Python 3.12, asyncio waits for each child process in a thread of
+    its own; wait on pidfds in the event loop instead where Linux has them.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(asyncio.get_running_loop())
+    asyncio.get_event_loop_policy().set_child_watcher(watcher)
+
+
+async def start_ai(filename, color, persistent=False, timeout=None):
+    """
+    Start the AI script filename (with its options) and do the handshake.
+
+    Args:
+        persistent (bool): Keep the AI for further games if it supports it
+        timeout (float): Seconds per move, AiPlayerInterface.TIMEOUT by default
+    """
+    command = [filename] if os.path.exists(filename) else shlex.split(filename)
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-u", *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    try:
+        name, offered = parse_introduction((await process.stdout.readline()).decode("ASCII"))
+        protocol = choose_protocol(offered)
+        player = AsyncAiPlayer(process, name, color, protocol, persistent and NEWGAME in offered,
+                               AiPlayerInterface.TIMEOUT if timeout is None else timeout)
+        await player.send(color_line(color, protocol))
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        raise
+    return player
+
+
+async def play_game_async(game, player1, player2, on_move=None):
+    """
+    Play game to the end, player1 being dark; see othello_game.play_game.
+
+    A player that times out, sends a malformed reply or plays an illegal
+    move forfeits, and is not kept for another game.
+
+    Returns:
+        dark_score, light_score (int): Final disc counts
+        timed_out: Color of the player who forfeited, or None
+    """
+    players = [None, player1, player2]
+    timed_out = None
+    while game.get_possible_moves():
+        color = game.current_player
+        start = time.time()
+        try:
+            i, j = await players[color].get_move(game)
+            seconds = time.time() - start
+            game.play(i, j)
+        except (AiTimeoutError, ValueError, InvalidMoveError):
+            players[color].timed_out = True
+            timed_out = color
+            break
+        if on_move is not None:
+            on_move(color, seconds)
+
+    dark_score, light_score = get_score(game.board)
+    await asyncio.gather(player1.kill(game), player2.kill(game))
+    return dark_score, light_score, timed_out
+
+
+async def run_games(specs, size, count, concurrency, persistent=False, timeout=None):
+    """
+    Play count games between the AI scripts specs[0] and specs[1],
+    alternating colors, at most concurrency at a time.
+
+    Returns:
+        results (list): (dark spec, light spec, dark score, light score,
+            color that forfeited or None) of every game
+        moves (int): Moves played in all games
+        threads (int): Most threads of this process seen during the games
+    """
+    use_pidfd_watcher()
+    limit = asyncio.Semaphore(concurrency)
+    idle = {spec: [] for spec in specs}     # Persistent AIs between games
+    stats = {"moves": 0, "threads": threading.active_count()}
+
+    async def get_ai(spec, color):
+        while idle[spec]:
+            player = idle[spec].pop()
+            if await player.new_game(color):
+                return player
+            await player.close()
+        return await start_ai(spec, color, persistent, timeout)
+
+    def on_move(color, seconds):
+        stats["moves"] += 1
+        stats["threads"] = max(stats["threads"], threading.active_count())
+
+    async def one_game(n):
+        dark, light = (specs[0], specs[1]) if n % 2 == 0 else (specs[1], specs[0])
+        async with limit:
+            started = await asyncio.gather(get_ai(dark, 1), get_ai(light, 2), return_exceptions=True)
+            players = [p for p in started if isinstance(p, AsyncAiPlayer)]
+            kept = []
+            try:
+                for p in started:
+                    if not isinstance(p, AsyncAiPlayer):
+                        raise p
+                result = await play_game_async(OthelloGameManager(size), *players, on_move=on_move)
+                for spec, player in zip((dark, light), players):
+                    if player.persistent and not player.timed_out:
+                        idle[spec].append(player)
+                        kept.append(player)
+            finally:
+                for player in players:
+                    if player not in kept:
+                        await player.close()
+        return (dark, light) + result
+
+    try:
+        results = await asyncio.gather(*(one_game(n) for n in range(count)))
+    finally:
+        await asyncio.gather(*(player.close() for players in idle.values() for player in players))
+    return results, stats["moves"], stats["threads"]
+
+
+def summarize(specs, results):
+    """
+    Print wins, draws and forfeits of each player; results are in game
+    order, so the first player is dark in the even games.
+    """
+    for n, spec in enumerate(specs):
+        wins = draws = forfeits = 0
+        for game, (_, _, dark_score, light_score, timed_out) in enumerate(results):
+            color = 1 if (game + n) % 2 == 0 else 2
+            own, other = (dark_score, light_score) if color == 1 else (light_score, dark_score)
+            if timed_out == color:
+                forfeits += 1
+            elif timed_out is not None or own > other:
+                wins += 1
+            elif own == other:
+                draws += 1
+        print("  {} {}: {} wins, {} draws, {} forfeits".format(n + 1, spec, wins, draws, forfeits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many AI games concurrently from one thread")
+    parser.add_argument("players", nargs=2, help="The two AI scripts with their options, e.g. \"mcts_ai.py --rollouts 100\"")
+    parser.add_argument("-b", default=6, type=int, help="Board size (default 6x6)")
+    parser.add_argument("-n", default=100, type=int, help="Games to play (default 100)")
+    parser.add_argument("--concurrency", default=100, type=int, help="Games running at once (default 100)")
+    parser.add_argument("--persistent", action="store_true", help="Reuse AI processes from game to game")
+    parser.add_argument("-t", "--timeout", type=float, help="Seconds per move (default {})".format(AiPlayerInterface.TIMEOUT))
+    parser.add_argument("--compare", type=int, default=0, metavar="N",
+                        help="Also play N games one after the other with othello_game.play_game")
+    args = parser.parse_args()
+
+    start = time.time()
+    results, moves, threads = asyncio.run(run_games(args.players, args.b, args.n, args.concurrency,
+                                                    args.persistent, args.timeout))
+    elapsed = time.time() - start
+    print("asyncio: {} games, {} moves in {:.1f}s: {:.1f} games/s, {:.0f} moves/s, at most {} threads".format(
+        len(results), moves, elapsed, len(results) / elapsed, moves / elapsed, threads))
+    summarize(args.players, results)
+
+    if args.compare:
+        from othello_game import make_player
+        if args.timeout is not None:
+            AiPlayerInterface.TIMEOUT = args.timeout
+        moves = 0
+        start = time.time()
+        for n in range(args.compare):
+            dark, light = args.players if n % 2 == 0 else args.players[::-1]
+            game = OthelloGameManager(args.b)
+            play_game(game, make_player(dark, 1), make_player(light, 2), verbose=False)
+            moves += int((game.board != 0).sum()) - 4
+        elapsed = time.time() - start
+        print("play_game: {} games, {} moves in {:.1f}s: {:.1f} games/s, {:.0f} moves/s".format(
+            args.compare, moves, elapsed, args.compare / elapsed, moves / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Unit tests for the bitboard rules engine
+"""
+
+import random
+import numpy as np
+import othello_shared
+import othello_bitboard
+from othello_bitboard import from_array, to_array, initial_board, legal_moves, play, square
+from perft import POSITIONS, REFERENCE, BACKENDS, get_position
+
+
+def random_game(size):
+    """
+    Yield (board, player, move) for every position of a random game, using
+    othello_shared as the reference implementation.
+    """
+    board = to_array(initial_board(size))
+    player = 1
+    while True:
+        moves = othello_shared.get_possible_moves(board, player)
+        move = random.choice(moves) if moves else None
+        yield board, player, move
+        if move is None:
+            return
+        board = othello_shared.play_move(board, player, move[0], move[1])
+        player = 1 if player == 2 else 2
+
+
+def main():
+    random.seed(0)
+    sizes = [3, 4, 5, 6, 7, 8, 9]
+
+    moves_ok = True
+    lines_ok = True
+    play_ok = True
+    native_ok = True
+    for size in sizes:
+        for _ in range(5):
+            for board, player, move in random_game(size):
+                if othello_bitboard.get_possible_moves(board, player) != \
+                        othello_shared.get_possible_moves(board, player):
+                    moves_ok = False
+                for i, j in np.argwhere(board.T == 0):     # NumPy integer coordinates
+                    if othello_bitboard.find_lines(board, i, j, player) != \
+                            othello_shared.find_lines(board, i, j, player):
+                        lines_ok = False
+                if move is None:
+                    continue
+                expected = othello_shared.play_move(board, player, move[0], move[1])
+                if not (othello_bitboard.play_move(board, player, move[0], move[1]) == expected).all():
+                    play_ok = False
+                b = from_array(board)
+                if not legal_moves(b, player) >> square(move[0], move[1], size) & 1 or \
+                        not (to_array(play(b, player, square(move[0], move[1], size))) == expected).all():
+                    native_ok = False
+
+    print("get_possible_moves() test {}".format("passed" if moves_ok else "failed"))
+    print("find_lines() test {}".format("passed" if lines_ok else "failed"))
+    print("play_move() test {}".format("passed" if play_ok else "failed"))
+    print("native API test {}".format("passed" if native_ok else "failed"))
+
+    perft_ok = True
+    for size in POSITIONS:
+        for name in POSITIONS[size]:
+            b, player = get_position(size, name)
+            for depth in (1, 2, 3):
+                for function, _ in BACKENDS.values():
+                    if function(b, player, depth) != REFERENCE[(size, name)][depth - 1]:
+                        perft_ok = False
+    print("perft test {}".format("passed" if perft_ok else "failed"))
+
+
+if __name__ == "__main__":
+    main()
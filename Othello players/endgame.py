@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Exact endgame solver for the last empty squares.
+
+The solver is a negamax alpha-beta search working directly on the two
+integer masks of a position, with the side to move first. It creates no
+Board tuples or hash entries inside the tree, and in the last plies, where
+most nodes are, no lists either: moves are taken bit by bit from the
+legal-move mask.
+
+Moves are ordered by
+
+* parity: the board is split into quadrants, and moves into quadrants with
+  an odd number of empty squares come first, so that we tend to get the
+  last move in each region, and
+* fastest first: while many squares are empty, moves leaving the opponent
+  the fewest replies come first, which finds cutoffs early.
+
+As in the game manager, the game ends when the player to move has no
+legal move.
+"""
+import time
+from functools import lru_cache
+
+from othello_bitboard import move_mask, flip_mask, popcount, sides
+
+# Positions with at most this many empty squares are solved exactly
+EXACT_EMPTIES = 12
+# Up to this many, the solver only decides win, draw or loss
+WLD_EMPTIES = 14
+# Fastest-first ordering is used while more squares than this are empty;
+# closer to the end parity ordering alone is cheaper
+FASTEST_FIRST_EMPTIES = 6
+
+
+class SolverTimeout(Exception):
+    pass
+
+
+# Deadline (time.time()) of the running solve and nodes visited so far
+deadline = None
+nodes = 0
+
+
+@lru_cache(maxsize=None)
+def quadrants(size):
+    """
+    Return the masks of the four quadrants of a board size.
+    """
+    half = size // 2
+    masks = []
+    for rows, cols in ((range(half), range(half)), (range(half), range(half, size)),
+                       (range(half, size), range(half)), (range(half, size), range(half, size))):
+        masks.append(sum(1 << (row * size + col) for row in rows for col in cols))
+    return tuple(masks)
+
+
+def odd_regions(empty, size):
+    """
+    Return the union of the quadrants holding an odd number of empty squares.
+    """
+    odd = 0
+    for q in quadrants(size):
+        if popcount(empty & q) & 1:
+            odd |= q
+    return odd
+
+
+def solve(own, opp, size, alpha, beta, empties):
+    """
+    Args:
+        own, opp (int): Discs of the side to move and of the opponent
+        size (int): Board dimension
+        alpha, beta: Window, from the point of view of the side to move
+        empties (int): Number of empty squares
+
+    Returns:
+        value (int): Final disc difference (own minus opp) with best play
+    """
+    global nodes
+    nodes += 1
+    if deadline is not None and not nodes & 1023 and time.time() > deadline:
+        raise SolverTimeout
+
+    moves = move_mask(own, opp, size)
+    if not moves:
+        return popcount(own) - popcount(opp)
+
+    best = -size * size
+    if empties > FASTEST_FIRST_EMPTIES:
+        ordered = []
+        m = moves
+        while m:
+            low = m & -m
+            m ^= low
+            sq = low.bit_length() - 1
+            flipped = flip_mask(own, opp, sq, size)
+            replies = popcount(move_mask(opp & ~flipped, own | flipped | low, size))
+            ordered.append((replies, sq, flipped))
+        ordered.sort()
+        for _, sq, flipped in ordered:
+            value = -solve(opp & ~flipped, own | flipped | (1 << sq), size, -beta, -alpha, empties - 1)
+            if value > best:
+                best = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        return best
+
+    odd = odd_regions(((1 << size * size) - 1) & ~(own | opp), size)
+    for m in (moves & odd, moves & ~odd):
+        while m:
+            low = m & -m
+            m ^= low
+            sq = low.bit_length() - 1
+            flipped = flip_mask(own, opp, sq, size)
+            value = -solve(opp & ~flipped, own | flipped | low, size, -beta, -alpha, empties - 1)
+            if value > best:
+                best = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        return best
+    return best
+
+
+def solve_root(b, player, wld=False, time_limit=None):
+    """
+    Solve Board b with player to move.
+
+    Args:
+        wld (bool): Only decide win, draw or loss, which is much faster
+        time_limit (float): Seconds before giving up, None for no limit
+
+    Returns:
+        value (int): Final disc difference for player with best play (with
+            wld, only its sign is meaningful), or None if time ran out
+        move (int): Square of a best move, or None
+    """
+    global deadline, nodes
+    own, opp = sides(b, player)
+    size = b.size
+    empties = size * size - popcount(own | opp)
+    moves = move_mask(own, opp, size)
+    if not moves:
+        return popcount(own) - popcount(opp), None
+
+    alpha, beta = (-1, 1) if wld else (-size * size, size * size)
+    deadline = None if time_limit is None else time.time() + time_limit
+    nodes = 0
+    best, best_move = -size * size - 1, None
+    try:
+        m = moves
+        while m:
+            low = m & -m
+            m ^= low
+            sq = low.bit_length() - 1
+            flipped = flip_mask(own, opp, sq, size)
+            value = -solve(opp & ~flipped, own | flipped | low, size, -beta, -alpha, empties - 1)
+            if value > best:
+                best, best_move = value, sq
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+    except SolverTimeout:
+        return None, None
+    finally:
+        deadline = None
+    return best, best_move
+
+
+def endgame_move(b, player, time_limit=None):
+    """
+    Solve b if few enough squares are empty: exactly up to EXACT_EMPTIES,
+    win/draw/loss up to WLD_EMPTIES.
+
+    Returns:
+        move (int): Square of a best move, or None if b is not an endgame
+            position or could not be solved in time_limit seconds
+    """
+    empties = b.size * b.size - popcount(b.dark | b.light)
+    if empties > WLD_EMPTIES:
+        return None
+    _, move = solve_root(b, player, wld=empties > EXACT_EMPTIES, time_limit=time_limit)
+    return move
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Positional evaluation of bitboard positions for depth-limited search.
+
+All scores are from the point of view of dark (positive is good for dark),
+like compute_utility. The evaluation combines
+
+* square weights: corners are good, X-squares (diagonally next to a corner)
+  and C-squares (next to a corner on the edge) are bad, edges are slightly good,
+* mobility: the difference in number of legal moves,
+* frontier discs: discs next to an empty square, which give the opponent moves,
+* stability: edge discs connected to an owned corner, which can never flip.
+
+Everything is precomputed per board size (one mask per weight class and a
+table of corner-anchored runs for every edge pattern), so evaluating a
+position costs a fixed number of integer operations.
+"""
+from functools import lru_cache
+
+from othello_bitboard import geometry, move_mask, popcount, utility
+
+CORNER_WEIGHT = 25
+X_WEIGHT = -12
+C_WEIGHT = -4
+EDGE_WEIGHT = 2
+MOBILITY_WEIGHT = 4
+FRONTIER_WEIGHT = -2
+STABILITY_WEIGHT = 8
+
+
+
+def _bit(i, j, size):
+    return 1 << (j * size + i)
+
+
+@lru_cache(maxsize=None)
+def tables(size):
+    """
+    Return the precomputed evaluation tables of a board size.
+
+    Returns:
+        weights (tuple): (weight, mask) pairs of the square classes
+        edges (tuple): The masks of the four edges
+        anchored (list): anchored[bits] is the number of discs of a d-bit edge
+            pattern connected to either end by a run of own discs
+        column_magic (int): Multiplier that gathers a column into d contiguous bits
+    """
+    last = size - 1
+    corners = _bit(0, 0, size) | _bit(last, 0, size) | _bit(0, last, size) | _bit(last, last, size)
+    x_squares = 0
+    c_squares = 0
+    for ci, cj, di, dj in ((0, 0, 1, 1), (last, 0, -1, 1), (0, last, 1, -1), (last, last, -1, -1)):
+        x_squares |= _bit(ci + di, cj + dj, size)
+        c_squares |= _bit(ci + di, cj, size) | _bit(ci, cj + dj, size)
+    x_squares &= ~corners
+    c_squares &= ~(corners | x_squares)
+
+    first_row = (1 << size) - 1
+    first_col = sum(1 << (row * size) for row in range(size))
+    edges = (first_row, first_row << (size * last), first_col, first_col << last)
+    edge_squares = (edges[0] | edges[1] | edges[2] | edges[3]) & ~(corners | x_squares | c_squares)
+    weights = tuple((w, m) for w, m in ((CORNER_WEIGHT, corners), (X_WEIGHT, x_squares),
+                                        (C_WEIGHT, c_squares), (EDGE_WEIGHT, edge_squares)) if m)
+
+    anchored = []
+    for bits in range(1 << size):
+        low = 0
+        while low < size and bits >> low & 1:
+            low += 1
+        high = 0
+        while high < size and bits >> (last - high) & 1:
+            high += 1
+        anchored.append(min(low + high, size))
+
+    # Bit row * size of a column lands on bit last**2 + row of the product,
+    # and since gcd(size, size - 1) == 1 no two partial products collide.
+    column_magic = sum(1 << (k * last) for k in range(size))
+    return weights, edges, anchored, column_magic
+
+
+def stable_discs(own, size):
+    """
+    Count the edge discs of own that are connected to an owned corner.
+    """
+    _, edges, anchored, magic = tables(size)
+    last = size - 1
+    row_mask = (1 << size) - 1
+    count = anchored[own & row_mask] + anchored[own >> (size * last)]
+    count += anchored[((own & edges[2]) * magic >> (last * last)) & row_mask]
+    count += anchored[(((own & edges[3]) >> last) * magic >> (last * last)) & row_mask]
+    corners = (own & 1) + (own >> last & 1) + (own >> (size * last) & 1) + (own >> (size * size - 1) & 1)
+    return count - corners
+
+
+def evaluate(b, player, moves):
+    """
+    Score a non-final position.
+
+    Args:
+        b (Board): Bitboard state
+        player: Dark (1) or light (2), the side to move
+        moves (int): Legal-move mask of player, already computed by the search
+
+    Returns:
+        score (int): Heuristic value, positive if dark is better
+    """
+    size = b.size
+    dark, light = b.dark, b.light
+    weights, _, _, _ = tables(size)
+    score = 0
+    for w, m in weights:
+        score += w * (popcount(dark & m) - popcount(light & m))
+
+    if player == 1:
+        mobility = popcount(moves) - popcount(move_mask(light, dark, size))
+    else:
+        mobility = popcount(move_mask(dark, light, size)) - popcount(moves)
+    score += MOBILITY_WEIGHT * mobility
+
+    full, _, left, right = geometry(size)
+    empty = full & ~(dark | light)
+    near_empty = 0
+    for s, m in left:
+        near_empty |= (empty & m) << s
+    for s, m in right:
+        near_empty |= (empty & m) >> s
+    score += FRONTIER_WEIGHT * (popcount(dark & near_empty) - popcount(light & near_empty))
+
+    score += STABILITY_WEIGHT * (stable_discs(dark, size) - stable_discs(light, size))
+    return score
+
+
+@lru_cache(maxsize=None)
+def final_weight(size):
+    """
+    Return one more than the largest heuristic score of a board size: every
+    weighted square owned by one side, a mobility and frontier difference of
+    one per square, and every edge disc stable.
+    """
+    weights, _, _, _ = tables(size)
+    bound = sum(abs(w) * popcount(m) for w, m in weights)
+    bound += (MOBILITY_WEIGHT + abs(FRONTIER_WEIGHT)) * size * size
+    bound += STABILITY_WEIGHT * 4 * size
+    return bound + 1
+
+
+def final_value(b):
+    """
+    Score a final position by its disc difference, scaled above all heuristic
+    scores so that any won game outranks them.
+    """
+    return final_weight(b.size) * utility(b)
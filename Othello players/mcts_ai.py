@@ -2,184 +2,445 @@
 # -*- coding: utf-8 -*
 """
 MCTS AI player for Othello.
+
+With --workers N the rollouts are split over N worker processes. Each grows
+its own tree from the root with its own random seed (root parallelization),
+and the visit counts and values of the root children are summed before the
+move is chosen. --benchmark compares the rollout rate of one process with
+that of the pool.
+
+With --playouts K every new leaf gets K random playouts at once from the
+batched engine in othello_batch (leaf parallelization), so the cost of
+select, expand and backprop is shared by K playouts. --benchmark with
+--playouts compares playouts per second and the results of games between
+K = 1 and K at equal time per move.
+
+The search itself runs on the compact array tree of mcts_tree, or with
+--transpositions on its graph version, which shares the node of a position
+among all move orders leading to it. --rave K blends all-moves-as-first
+statistics of the playouts into the selection, with a weight that halves
+at K visits; --benchmark with --rave plays games against plain UCT at
+--rollouts rollouts per move.
+
+In a game the player searches anytime: rollouts run until a share of
+AiPlayerInterface.TIMEOUT is used up, or until the most visited move can no
+longer be overtaken in the time that is left.
+
+Usage: python mcts_ai.py --benchmark --workers 4 -b 8
+       python mcts_ai.py --benchmark --playouts 128 -b 8 --games 4
+       python mcts_ai.py --benchmark --rave 300 -b 8 --rollouts 1000 --games 10
 """
 
+import argparse
 import random
+import sys
+import time
+from concurrent.futures import wait
 import numpy as np
 from six.moves import input
-from othello_shared import get_possible_moves, play_move, compute_utility
+from othello_bitboard import get_possible_moves, play_move, from_array, to_array, utility, coordinates
+import mcts_tree
+from mcts_tree import Tree, TranspositionTree, random_playout, random_playout_moves, batch_playout
+from othello_game import AiPlayerInterface
+from endgame import endgame_move
+from opening_book import book_move
+from worker_pool import get_pool
+from protocol import introduction, parse_color, read_board
+from search_stats import SearchStats, rate
+
+# Share of AiPlayerInterface.TIMEOUT the endgame solver may use
+ENDGAME_FRACTION = 0.3
+# Share of AiPlayerInterface.TIMEOUT a move may use in total
+TIME_FRACTION = 0.5
+# Rollouts between two checks whether the search can stop early
+EARLY_STOP_INTERVAL = 16
+
+# Random generator of the batched playouts
+rng = np.random.default_rng()
 
+# (rollouts, seconds, stopped early) of the last search, None if the move
+# came from the opening book or the endgame solver
+last_search = None
+# Phase times of the last move, and the deepest leaf and the moves of the
+# single playouts of its last run_rollouts
+move_stats = SearchStats()
+rollout_stats = (0, 0)
 
-class Node:
-    def __init__(self, state, player, parent, children, v=0, N=0):
-        self.state = state
-        self.player = player
-        self.parent = parent
-        self.children = children
-        self.value = v
-        self.N = N
 
-    def get_child(self, state):
-        for c in self.children:
-            if (state == c.state).all():
-                return c
-        return None
+def new_tree(b, player, transpositions=False, rave=None):
+    """ Return an empty search tree (a graph with transpositions) of Board b.
+    """
+    return (TranspositionTree if transpositions else Tree)(b, player, rave_k=rave)
+
 
+def decided(tree, remaining):
+    """ Return True if no other root child can catch up with the most
+    visited one in remaining more visits.
+    """
+    visits = sorted((int(tree.N[c]) for c in tree.children()), reverse=True)
+    if len(visits) < 2:
+        return True
+    return visits[0] - visits[1] > remaining
 
-def select(root, alpha):
-    """ Starting from given node, find a terminal node or node with unexpanded children.
-    If all children of a node are in tree, move to the one with the highest UCT value.
 
-    Args:
-        root (Node): MCTS tree root node
-        alpha (float): Weight of exploration term in UCT
+def run_rollouts(tree, alpha, rollouts=None, stop_time=None, playouts=1, early_stop=False):
+    """ Execute the four MCTS steps until rollouts are done or time.time()
+    passes stop_time, whichever comes first. With playouts > 1, every
+    rollout simulates that many games from the new leaf as one batch, and
+    the AMAF statistics of a RAVE tree are not updated.
+    With early_stop and a stop_time, also stop once the most visited root
+    child cannot be overtaken at the rollout rate measured so far.
 
     Returns:
-        node (Node): Node at bottom of MCTS tree
+        count (int): Number of rollouts executed
     """
-    current = root
-    while True:
-        new_move = get_possible_moves(current.state, current.player)
-        if not new_move:
-            break
-        notexpanded = False
-        for n in new_move:
-            new_state = play_move(current.state, current.player, n[0], n[1])
-            if current.get_child(new_state) is None:
-                notexpanded = True
+    global rollout_stats
+    count = 0
+    deepest = 0
+    moves = mcts_tree.playout_moves
+    start = time.time()
+    while rollouts is None or count < rollouts:
+        if stop_time is not None:
+            now = time.time()
+            if now >= stop_time:
                 break
-        if notexpanded:
-            break
-            
-        highest_uct = -float("inf")
-        highest_child = None
-        for n in current.children:
-            uct =  n.value / n.N + (alpha * np.sqrt(np.log(current.N) / n.N))
-            if uct > highest_uct:
-                highest_uct = uct
-                highest_child = n
-        current = highest_child
+            if early_stop and count and not count % EARLY_STOP_INTERVAL:
+                remaining = count / (now - start) * (stop_time - now)
+                if rollouts is not None:
+                    remaining = min(remaining, rollouts - count)
+                if decided(tree, remaining * playouts):
+                    break
+        path, b, player = tree.descend(alpha)
+        if len(path) > deepest:
+            deepest = len(path)
+        played = None
+        if playouts > 1:
+            utility = batch_playout(b, player, playouts, rng)
+        elif tree.rave_k:
+            utility, played = random_playout_moves(b, player)
+        else:
+            utility = random_playout(b, player)
+        tree.backprop(path, utility, playouts, played)
+        count += 1
+    rollout_stats = (max(deepest - 1, 0), mcts_tree.playout_moves - moves)
+    return count
 
-    root = current
-    return root
 
+def most_visited(stats):
+    """ Return the move with the most rollouts from a dict mapping moves to
+    (N, value) pairs, or None if it is empty.
+    """
+    move = None
+    plays = 0
+    for m, (n, _) in stats.items():
+        if n > plays:
+            plays = n
+            move = m
+    return move
 
-def expand(node):
-    """ Add a child node of state into the tree if it's not terminal.
 
-    Args:
-        node (Node): Node to expand
+def mcts_worker(state, player, alpha, seed, rollouts=None, stop_time=None, playouts=1, transpositions=False,
+                rave=None):
+    """ Grow an independent tree from state in a worker process.
 
     Returns:
-        leaf (Node): Newly created node (or given Node if already leaf)
+        stats (dict): (N, value) of every root child, keyed by move
+        count (int): Number of rollouts executed
     """
-    possible_moves = get_possible_moves(node.state, node.player)
-    if not possible_moves:
-        return node
-    
-    for n in possible_moves:
-        new_state = play_move(node.state, node.player, n[0], n[1])
-        if node.get_child(new_state) is None:
-            if node.player ==2:
-                next_player = 1
-            else:
-                next_player = 2
-            child_list = []
-            leaf_node = Node(new_state, next_player, node, child_list)
-            node.children.append(leaf_node)
-            return leaf_node  
-    return node
+    global rng
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    tree = new_tree(from_array(state), player, transpositions, rave)
+    count = run_rollouts(tree, alpha, rollouts, stop_time, playouts)
+    return tree.root_stats(), count
+
+
+def parallel_mcts(state, player, alpha=5, workers=2, rollouts=None, stop_time=None, playouts=1,
+                  transpositions=False, rave=None):
+    """ Root-parallel MCTS: split rollouts over workers processes, each with
+    its own tree and seed, and merge the root children.
+
+    Returns:
+        stats (dict): Summed (N, value) of every root child, keyed by move
+        count (int): Number of rollouts executed by all workers
+    """
+    executor = get_pool(workers)
+    futures = []
+    for i in range(workers):
+        share = None if rollouts is None else rollouts // workers + (i < rollouts % workers)
+        futures.append(executor.submit(mcts_worker, state, player, alpha,
+                                       random.getrandbits(32), share, stop_time, playouts, transpositions, rave))
+    wait(futures)
+    stats = {}
+    count = 0
+    for future in futures:
+        worker_stats, worker_count = future.result()
+        for m, (n, v) in worker_stats.items():
+            total_n, total_v = stats.get(m, (0, 0))
+            stats[m] = (total_n + n, total_v + v)
+        count += worker_count
+    return stats, count
+
+
+def mcts(state, player, rollouts=100, alpha=5, tree=None, workers=1, time_limit=None, playouts=1,
+         transpositions=False, rave=None):
+    # MCTS main loop: Execute four steps rollouts number of times
+    # Then return successor with highest number of rollouts
+    # With playouts > 1, each rollout plays that many batched games from its leaf
+    # A Tree of state from an earlier search (see Tree.advance) keeps its statistics
+    # Without one, a TranspositionTree is searched if transpositions is set,
+    # with RAVE if rave is set
+    # With time_limit, rollouts run until time_limit seconds after the call
+    # instead, or until the most visited move is certain to stay ahead
+    # With more than one worker, the rollouts run in parallel trees and tree is not used
+    # Book positions are answered from the opening book, and endgame
+    # positions are solved exactly instead, if there is time
+    global last_search, move_stats
+    start = time.time()
+    move_stats = SearchStats()
+    endgame_time = ENDGAME_FRACTION * AiPlayerInterface.TIMEOUT
+    if time_limit is not None:
+        rollouts, stop_time = None, start + time_limit
+        endgame_time = min(endgame_time, time_limit / 2)
+    else:
+        stop_time = None
+    last_search = None
+    b = from_array(state)
+    move = book_move(b, player)
+    move_stats.phase("book")
+    if move is None:
+        move = endgame_move(b, player, endgame_time)
+        move_stats.phase("endgame")
+    if move is not None:
+        return coordinates(move, state.shape[0])
+
+    if workers > 1:
+        stats, count = parallel_mcts(state, player, alpha, workers, rollouts, stop_time, playouts,
+                                     transpositions, rave)
+        early = False
+    else:
+        if tree is None:
+            tree = new_tree(b, player, transpositions, rave)
+        count = run_rollouts(tree, alpha, rollouts, stop_time, playouts, early_stop=True)
+        stats = tree.root_stats()
+        early = stop_time is not None and time.time() < stop_time
+    move_stats.phase("search")
+    last_search = (count, time.time() - start, early)
+    move = most_visited(stats)
+    if move is None:
+        move = get_possible_moves(state, player)[0]
+    return move
+
+
+def initial_state(size):
+    state = np.zeros((size, size), dtype=int)
+    half = size // 2
+    state[half - 1, half - 1] = state[half, half] = 2
+    state[half - 1, half] = state[half, half - 1] = 1
+    return state
+
+
+def benchmark(size, workers, seconds, alpha=5):
+    """ Print the rollouts per second from the initial board of one process
+    and of workers processes, and the speedup.
+    """
+    state = initial_state(size)
+    tree = Tree(from_array(state), 1)
+    start = time.time()
+    count = run_rollouts(tree, alpha, stop_time=start + seconds)
+    serial = count / (time.time() - start)
+    print("1 process: {} rollouts, {:.0f} rollouts/s".format(count, serial))
 
+    parallel_mcts(state, 1, alpha, workers, rollouts=workers)   # start the workers
+    start = time.time()
+    _, count = parallel_mcts(state, 1, alpha, workers, stop_time=start + seconds)
+    parallel = count / (time.time() - start)
+    print("{} processes: {} rollouts, {:.0f} rollouts/s".format(workers, count, parallel))
+    print("Speedup: {:.2f}x".format(parallel / serial))
 
-def simulate(node):
-    """ Run one game rollout using from state to a terminal state.
-    Use random playout policy.
 
-    Args:
-        node (Node): Leaf node from which to start rollout.
+def play_match(size, options, reference, color):
+    """ Play one game between MCTS players called with the mcts keyword
+    arguments options and reference, the former playing color.
 
     Returns:
-        utility (int): Utility of final state
+        utility (int): Final disc difference for the options player
     """
-    state1 = np.array(node.state)
-    player1 = node.player
+    state = initial_state(size)
+    player = 1
     while True:
-        possible_moves = get_possible_moves(state1, player1)
-        if not possible_moves:
+        moves = get_possible_moves(state, player)
+        if not moves:
             break
-        next_move = random.choice(possible_moves)
-        state1 = play_move(state1, player1, next_move[0], next_move[1])
-        if player1 ==2:
-            player1=1
-        else:
-            player1=2
-    return compute_utility(state1)
+        i, j = mcts(state, player, **(options if player == color else reference))
+        state = play_move(state, player, i, j)
+        player = 1 if player == 2 else 2
+    final = utility(from_array(state))
+    return final if color == 1 else -final
 
 
-def backprop(node, utility):
-    """ Backpropagate result from state up to the root.
-    Every node has N, number of plays, incremented
-    If node's parent is dark (1), then node's value increases
-    Otherwise, node's value decreases.
+def compare_playouts(size, playouts, seconds, games, move_time):
+    """ Print playouts per second from the initial board with 1 and with
+    playouts games per rollout, then play games between the two at move_time
+    seconds per move, alternating colors.
+    """
+    for k in (1, playouts):
+        tree = Tree(from_array(initial_state(size)), 1)
+        start = time.time()
+        count = run_rollouts(tree, 5, stop_time=start + seconds, playouts=k)
+        elapsed = time.time() - start
+        print("{} playouts per rollout: {:.0f} rollouts/s, {:.0f} playouts/s".format(
+            k, count / elapsed, count * k / elapsed))
+
+    if games:
+        wins, draws, losses = play_matches(size, games, dict(time_limit=move_time, playouts=playouts),
+                                           dict(time_limit=move_time))
+        print("{} playouts vs 1 at {}s per move: {} wins, {} draws, {} losses".format(
+            playouts, move_time, wins, draws, losses))
 
-    Args:
-        node (Node): Leaf node from which rollout started.
-        utility (int): Utility of simulated rollout.
+
+def play_matches(size, games, options, reference):
+    """ Play games between the options and reference players (see
+    play_match), alternating colors.
+
+    Returns:
+        wins, draws, losses (int): Results of the options player
     """
-    while node is not None:
-        node.N += 1
-        if node.player == 1:
-            node.value -= utility
+    wins = draws = losses = 0
+    for game in range(games):
+        result = play_match(size, options, reference, 1 if game % 2 == 0 else 2)
+        if result > 0:
+            wins += 1
+        elif result < 0:
+            losses += 1
         else:
-            node.value += utility
-        node = node.parent
+            draws += 1
+    return wins, draws, losses
 
 
-def mcts(state, player, rollouts=100, alpha=5):
-    # MCTS main loop: Execute four steps rollouts number of times
-    # Then return successor with highest number of rollouts
-    root = Node(state, player, None, [], 0, 1)
-    for i in range(rollouts):
-        leaf = select(root, alpha)
-        new = expand(leaf)
-        utility = simulate(new)
-        backprop(new, utility)
+def compare_rave(size, rave, rollouts, games):
+    """ Play games between MCTS with and without RAVE at rollouts rollouts
+    per move, alternating colors.
+    """
+    start = time.time()
+    wins, draws, losses = play_matches(size, games, dict(rollouts=rollouts, rave=rave),
+                                       dict(rollouts=rollouts))
+    print("RAVE {} vs UCT at {} rollouts per move: {} wins, {} draws, {} losses ({:.0f}s)".format(
+        rave, rollouts, wins, draws, losses, time.time() - start))
 
-    move = None
-    plays = 0
-    for m in get_possible_moves(state, player):
-        s = play_move(state, player, m[0], m[1])
-        if root.get_child(s).N > plays:
-            plays = root.get_child(s).N
-            move = m
 
-    return move
+####################################################
+def search_summary(tree=None, playouts=1):
+    """
+    Return the statistics of the last move as one line. tree is the tree
+    searched, None for parallel searches, whose trees are in the workers.
+    """
+    if last_search is not None:
+        count, _, early = last_search
+        move_stats.add("rollouts", count)
+        move_stats.add("rollouts/s", rate(count, move_stats.seconds("search")), "{:.0f}")
+        if tree is not None:
+            deepest, moves = rollout_stats
+            move_stats.add("tree nodes", len(tree))
+            if count:
+                move_stats.add("max depth", deepest)
+            if playouts == 1 and count:
+                move_stats.add("playout length", moves / count, "{:.1f}")
+        if early:
+            move_stats.add("stopped", "early")
+    else:
+        move_stats.add("move from", "endgame solver" if "endgame" in dict(move_stats.phases) else "book")
+    return move_stats.summary("MCTS")
 
 
-####################################################
-def run_ai():
+def run_ai(workers=1, playouts=1, rollouts=None, transpositions=False, rave=None, show_stats=False):
     """
     This function establishes communication with the game manager.
     It first introduces itself and receives its color.
     Then it repeatedly receives the current score and current board state
     until the game is over.
+    With more than one worker, the trees are not kept between turns.
+    Each rollout plays playouts batched games from its leaf.
+    Moves get TIME_FRACTION of the timeout, or exactly rollouts rollouts.
+    With transpositions, the search shares nodes between move orders.
+    rave turns on RAVE with that equivalence parameter.
+    With show_stats, the search statistics of every move go to stderr.
     """
-    print("MCTS AI")        # First line is the name of this AI
-    color = int(input())    # 1 for dark (first), 2 for light (second)
+    print(introduction("MCTS AI"))          # First line is the name of this AI
+    color, protocol = parse_color(input())  # 1 for dark (first), 2 for light (second)
+    tree = None             # Tree of our last search, kept between turns
 
     while True:
         # Read in the current game status, for example:
-        # "SCORE 2 2" or "FINAL 33 31" if the game is over.
+        # "SCORE 2 2" or "FINAL 33 31" if the game is over,
+        # then possibly "NEWGAME 2" to play another game as light.
         next_input = input()
-        status, dark_score_s, light_score_s = next_input.strip().split()
+        status = next_input.split()[0]
 
-        if status == "FINAL":
+        if status == "NEWGAME":
+            color = int(next_input.split()[1])
+            tree = None
+        elif status == "FINAL":
             print()
         else:
-            board = np.array(eval(input()))
-            movei, movej = mcts(board, color)
+            b = read_board(protocol)
+            board = to_array(b)
+            if rollouts is None:
+                options = dict(time_limit=TIME_FRACTION * AiPlayerInterface.TIMEOUT)
+            else:
+                options = dict(rollouts=rollouts)
+            if workers > 1:
+                movei, movej = mcts(board, color, workers=workers, playouts=playouts,
+                                    transpositions=transpositions, rave=rave, **options)
+            else:
+                if tree is None or not tree.advance(b, color):
+                    tree = new_tree(b, color, transpositions, rave)
+                movei, movej = mcts(board, color, tree=tree, playouts=playouts, **options)
             print("{} {}".format(movei, movej))
+            if show_stats:
+                sys.stderr.write(search_summary(tree if workers == 1 else None, playouts) + "\n")
+            elif last_search is None:
+                sys.stderr.write("MCTS: book or endgame move\n")
+            else:
+                count, seconds, early = last_search
+                sys.stderr.write("MCTS: {} rollouts in {:.2f}s{}\n".format(
+                    count, seconds, ", stopped early" if early else ""))
 
 
 if __name__ == "__main__":
-    run_ai()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="MCTS AI player for Othello")
+    parser.add_argument(
+        "--workers", default=1, type=int, help="Processes for root-parallel rollouts (default 1)"
+    )
+    parser.add_argument(
+        "--playouts", default=1, type=int, help="Batched playouts per rollout (default 1)"
+    )
+    parser.add_argument(
+        "--transpositions", action="store_true", help="Share nodes of positions reached by different move orders"
+    )
+    parser.add_argument(
+        "--rave", type=int, help="Use RAVE, with AMAF weight 1/2 at this many visits (e.g. 300)"
+    )
+    parser.add_argument(
+        "--rollouts", type=int, help="Fixed rollouts per move instead of a time budget"
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="Print rollouts, tree size and depth, and phase times of every move to stderr"
+    )
+    parser.add_argument(
+        "--benchmark", action="store_true",
+        help="Compare rollouts/s of 1 and --workers processes, 1 and --playouts playouts, or UCT and --rave, then exit"
+    )
+    parser.add_argument("-b", default=8, type=int, help="Board size for --benchmark (default 8x8)")
+    parser.add_argument("--seconds", default=3.0, type=float, help="Duration of each --benchmark run (default 3)")
+    parser.add_argument("--games", default=4, type=int, help="Games played by --benchmark --playouts/--rave (default 4)")
+    parser.add_argument("--move-time", default=0.5, type=float, help="Seconds per move in those games (default 0.5)")
+    args = parser.parse_args()
+    if args.benchmark and args.rave:
+        compare_rave(args.b, args.rave, args.rollouts or 1000, args.games)
+    elif args.benchmark and args.playouts > 1:
+        compare_playouts(args.b, args.playouts, args.seconds, args.games, args.move_time)
+    elif args.benchmark:
+        benchmark(args.b, args.workers, args.seconds)
+    else:
+        run_ai(args.workers, args.playouts, args.rollouts, args.transpositions, args.rave, args.stats)
\ No newline at end of file
@@ -4,75 +4,189 @@
 Unit tests for MCTS
 """
 
+import random
 import numpy as np
-from othello_shared import get_possible_moves, play_move, compute_utility
-from mcts_ai import Node, select, expand, simulate, backprop
-
-
-def main():
+from mcts_tree import Tree, TranspositionTree, random_playout, random_playout_moves
+from othello_bitboard import from_array, initial_board, play, square
+
+
+def subtree_stats(tree, node):
+    """
+    Return the statistics of every child of node and of their children,
+    keyed by the moves leading to them.
+    """
+    stats = {}
+    for child in tree.children(node):
+        key = (int(tree.move[child]),)
+        stats[key] = (int(tree.N[child]), int(tree.amaf_N[child]), int(tree.value[child]))
+        for grandchild in tree.children(child):
+            stats[key + (int(tree.move[grandchild]),)] = (
+                int(tree.N[grandchild]), int(tree.amaf_N[grandchild]), int(tree.value[grandchild]))
+    return stats
+
+
+def tree_is_consistent(tree):
+    """
+    Check that every node below the root lies in the child block of its parent.
+    """
+    for node in range(1, tree.count):
+        parent = tree.parent[node]
+        first = tree.first_child[parent]
+        if parent < 0 or not first <= node < first + tree.child_count[parent]:
+            return False
+    return True
+
+
+def test_tree():
+    """
+    descend, backprop and the playouts on a small hand-built tree.
+    """
     initial = np.array([[2,1,0,0],
                         [0,2,2,2],
                         [0,1,2,0],
                         [1,2,1,0]])
 
-    child1 = np.array([[2,1,1,0],
-                       [0,2,1,2],
-                       [0,1,1,0],
-                       [1,2,1,0]])
-
-    child2 = np.array([[2,1,0,1],
-                       [0,2,1,2],
-                       [0,1,2,0],
-                       [1,2,1,0]])
-
-    child3 = np.array([[2,1,0,0],
-                       [0,2,1,2],
-                       [0,1,1,1],
-                       [1,2,1,0]])
-
-    grandchild1 = np.array([[2,2,2,0],
-                            [0,2,1,2],
-                            [0,1,1,1],
-                            [1,2,1,0]])
-
-    root = Node(initial, 1, None, [], 0, 20)
-    node1 = Node(child1, 2, root, [], -1, 1)
-    node2 = Node(child2, 2, root, [], 1.5, 17)
-    node3 = Node(child3, 2, root, [], 1, 2)
-    node4 = Node(grandchild1, 1, node3, [], 0, 2)
-    root.children = root.children + [node1, node2, node3]
-    node3.children.append(node4)
-
-    if (select(root, 1).state == child3).all():
-        print("select() test passed")
-    else:
-        print("select() test failed")
-
     grandchild2 = np.array([[2,1,0,0],
                             [0,2,1,2],
                             [0,1,2,2],
                             [1,2,2,2]])
 
-    if (expand(node3).state == grandchild2).all():
-        print("expand() test passed")
+    b = from_array(initial)
+    tree = Tree(b, 1)
+    tree.N[0] = 20
+    tree._expand(0, b, 1)
+    # (N, value) of the root children, all tried, by (column,row) move
+    visited = {(2, 0): (1, -1), (3, 0): (17, 2), (3, 2): (2, 1)}
+    for child in tree.children():
+        move = int(tree.move[child])
+        tree.N[child], tree.value[child] = visited[(move % 4, move // 4)]
+    tree.tried[0] = tree.child_count[0]
+    # The child of (3,2) has one tried child of its own, (2,0)
+    node3 = [c for c in tree.children() if tree.move[c] == square(3, 2, 4)][0]
+    tree._expand(node3, play(b, 1, square(3, 2, 4)), 2)
+    first = int(tree.first_child[node3])
+    ok = tree.move[first] == square(2, 0, 4)
+    tree.N[first] = 2
+    tree.tried[node3] = 1
+
+    path, leaf, player = tree.descend(1)
+    if ok and path[:2] == [0, node3]:
+        print("descend() select test passed")
     else:
-        print("expand() test failed")
+        print("descend() select test failed")
 
-    node5 = Node(grandchild2, 1, node3, [], 0, 0)
-    node3.children.append(node5)
+    if len(path) == 3 and leaf == from_array(grandchild2) and player == 1:
+        print("descend() expand test passed")
+    else:
+        print("descend() expand test failed")
 
-    res = simulate(node5)
+    res = random_playout(leaf, player)
     if res == -6 or res == -10:
-        print("simulate() test passed")
+        print("random_playout() test passed")
     else:
-        print("simulate() test failed")
+        print("random_playout() test failed")
 
-    backprop(node5, -6)
-    if node5.value == 6 and node3.value == -5 and root.value == 6:
+    tree.backprop(path, -6)
+    if tree.value[path[2]] == 6 and tree.value[node3] == -5 and tree.value[0] == 6 and \
+            tree.N[path[2]] == 1 and tree.N[node3] == 3 and tree.N[0] == 21:
         print("backprop() test passed")
     else:
         print("backprop() test failed")
 
 
+def test_rave_advance():
+    """
+    Advancing a RAVE tree keeps the statistics of every node with its move
+    and clears the arrays past the new tree.
+    """
+    random.seed(0)
+    b = initial_board(6)
+    tree = Tree(b, 1, rave_k=300)
+    for _ in range(2000):
+        path, leaf, player = tree.descend(5)
+        utility, played = random_playout_moves(leaf, player)
+        tree.backprop(path, utility, 1, played)
+    child = max(tree.children(), key=lambda c: tree.N[c])
+    expected = subtree_stats(tree, child)
+    old_count = tree.count
+    ok = tree.advance(play(b, 1, int(tree.move[child])), 2)
+    ok = ok and subtree_stats(tree, tree.root) == expected and tree_is_consistent(tree)
+    for name, _, fill in tree.FIELDS:
+        ok = ok and (getattr(tree, name)[tree.count:old_count] == fill).all()
+    print("RAVE advance() test {}".format("passed" if ok else "failed"))
+
+
+def test_transpositions():
+    """
+    In the graph, the visits and values of every position are the sums over
+    the edges leading to it, and positions reached by different move orders
+    share one node. advance keeps the statistics reachable from the new root
+    and drops the rest, including edges into kept positions, whose visits
+    stay in the node statistics.
+    """
+    random.seed(0)
+    b = initial_board(6)
+    tree = TranspositionTree(b, 1)
+
+    def reachable_stats(node):
+        """
+        Edge and node statistics of every path of up to three moves from node.
+        """
+        stats = {}
+        level = {(): node}
+        for _ in range(3):
+            next_level = {}
+            for moves, n in level.items():
+                for edge in tree.children(n):
+                    key = moves + (int(tree.move[edge]),)
+                    t = int(tree.target[edge])
+                    stats[key] = (int(tree.N[edge]), int(tree.value[edge]),
+                                  int(tree.node_N[t]) if t >= 0 else None)
+                    if t >= 0:
+                        next_level[key] = t
+            level = next_level
+        return stats
+
+    def excess():
+        """
+        Return the node visits and values beyond the sums over the edges
+        into each node, for every node.
+        """
+        edges = np.arange(tree.count)
+        targets = tree.target[:tree.count]
+        reached = targets >= 0
+        n = np.bincount(targets[reached], weights=tree.N[edges[reached]], minlength=tree.count)
+        value = np.bincount(targets[reached], weights=tree.value[edges[reached]], minlength=tree.count)
+        nodes = np.unique(targets[reached])
+        return dict(zip(nodes.tolist(), zip((tree.node_N[nodes] - n[nodes]).tolist(),
+                                            (tree.node_value[nodes] - value[nodes]).tolist())))
+
+    for _ in range(1500):
+        path, leaf, player = tree.descend(5)
+        tree.backprop(path, random_playout(leaf, player))
+    ok = tree.hits > 0 and set(excess().values()) == {(0, 0)}
+    child = max(tree.children(), key=lambda c: tree.N[c])
+    after = play(b, 1, int(tree.move[child]))
+    node = int(tree.target[child])
+    expected = reachable_stats(node)
+    old_count = tree.count
+    ok = ok and tree.advance(after, 2) and tree.root == 0 and tree.table[after] == 0
+    ok = ok and tree.count < old_count and reachable_stats(tree.root) == expected
+    kept = excess()
+    ok = ok and sorted(tree.table.values()) == sorted(kept)
+    for _ in range(500):
+        path, leaf, player = tree.descend(5)
+        tree.backprop(path, random_playout(leaf, player))
+    ok = ok and all(kept.get(node, (0, 0)) == stats for node, stats in excess().items())
+    ok = ok and tree.table[after] == tree.root
+    print("TranspositionTree test {}".format("passed" if ok else "failed"))
+
+
+def main():
+    test_tree()
+    test_rave_advance()
+    test_transpositions()
+
+
 if __name__ == "__main__":
     main()
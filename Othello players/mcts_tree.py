@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Compact MCTS tree stored as parallel NumPy arrays.
+
+Every node is one index into the arrays N (visits), value (summed utility
+from the point of view of the player who moved into the node), parent,
+move (the square played to reach the node), first_child, child_count and
+tried. Children of a node are allocated together, as one contiguous block,
+the first time the node is expanded, and are visited for the first time
+in get_possible_moves order, so the untried children of a node are simply
+the last child_count - tried of its block.
+
+Boards are not stored at all: the walk from the root replays the moves
+on the bitboard of the root position. Players alternate on every move, so
+the color to move at a node follows from its depth.
+
+TranspositionTree turns the tree into a graph: positions reached by
+different move orders share one node, found through a table keyed by the
+board. Visits and values are then kept twice, per edge (the entries above,
+updated only by rollouts that took the edge) and per node (shared by all
+paths into the position). Selection uses the shared mean value of a child
+with the exploration term of the edge, and backpropagation updates both
+along the path actually walked, which stays correct in a DAG. Since the
+number of discs grows with every move, the graph has no cycles.
+
+With rave_k, both also keep all-moves-as-first (AMAF) statistics per edge:
+a rollout counts for every edge out of a node on its path whose move the
+player at that node played later in the path or in the playout. Selection
+blends the AMAF mean into the mean value with weight
+sqrt(rave_k / (3 N + rave_k)), which fades as the edge gets visits N.
+
+Usage: python mcts_tree.py -b 8 --rollouts 5000   (memory and walk time per rollout)
+       python mcts_tree.py -b 6 --rollouts 2000 --positions 20   (compare with TranspositionTree)
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from othello_batch import playout, playout_bitboards
+from othello_bitboard import initial_board, legal_moves, play, squares, coordinates, utility, iter_squares, to_array, popcount
+
+# Moves played by random_playout and random_playout_moves in this process
+playout_moves = 0
+
+
+def random_playout(b, player):
+    """
+    Play Board b to the end with uniformly random moves.
+
+    Returns:
+        utility (int): Utility of the final state
+    """
+    global playout_moves
+    discs = popcount(b.dark | b.light)
+    while True:
+        moves = legal_moves(b, player)
+        if not moves:
+            playout_moves += popcount(b.dark | b.light) - discs
+            return utility(b)
+        b = play(b, player, random.choice(list(iter_squares(moves))))
+        player = 1 if player == 2 else 2
+
+
+def random_playout_moves(b, player):
+    """
+    Play Board b to the end with uniformly random moves, recording them.
+
+    Returns:
+        utility (int): Utility of the final state
+        played (tuple): played[1] and played[2] are the squares played by
+            dark and light
+    """
+    global playout_moves
+    played = (None, [], [])
+    while True:
+        moves = legal_moves(b, player)
+        if not moves:
+            playout_moves += len(played[1]) + len(played[2])
+            return utility(b), played
+        sq = random.choice(list(iter_squares(moves)))
+        played[player].append(sq)
+        b = play(b, player, sq)
+        player = 1 if player == 2 else 2
+
+
+def batch_playout(b, player, k, rng=None):
+    """
+    Play k random games from Board b at once with the batched engine.
+
+    Returns:
+        utility (int): Sum of the utilities of the final states
+    """
+    players = np.full(k, player)
+    if b.size <= 8:
+        dark = np.full(k, b.dark, dtype=np.uint64)
+        light = np.full(k, b.light, dtype=np.uint64)
+        utilities = playout_bitboards(dark, light, players, b.size, rng)
+    else:
+        utilities = playout(np.repeat(to_array(b)[None], k, axis=0), players, rng)
+    return int(utilities.sum())
+
+
+class Tree(object):
+    """
+    MCTS tree of the position Board b with player to move.
+    """
+
+    # (name, dtype, initial value) of the per-node arrays
+    FIELDS = (("N", np.int32, 0), ("value", np.int64, 0), ("parent", np.int32, -1),
+              ("move", np.int16, -1), ("first_child", np.int32, -1),
+              ("child_count", np.uint8, 0), ("tried", np.uint8, 0))
+    RAVE_FIELDS = (("amaf_N", np.int32, 0), ("amaf_value", np.int64, 0))
+
+    def __init__(self, b, player, capacity=4096, rave_k=None):
+        self.board = b
+        self.player = player
+        self.rave_k = rave_k
+        if rave_k:
+            self.FIELDS = self.FIELDS + self.RAVE_FIELDS
+        for name, dtype, fill in self.FIELDS:
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+        self.root = 0
+        self.count = 1
+        self.N[0] = 1
+
+    def __len__(self):
+        return self.count
+
+    def arrays(self):
+        return tuple(getattr(self, name) for name, _, _ in self.FIELDS)
+
+    def bytes_per_node(self):
+        return sum(a.itemsize for a in self.arrays())
+
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays())
+
+    def _reserve(self, n):
+        """
+        Make room for n more nodes, doubling the arrays as needed.
+        """
+        capacity = len(self.N)
+        if self.count + n <= capacity:
+            return
+        while capacity < self.count + n:
+            capacity *= 2
+        for name, dtype, fill in self.FIELDS:
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _expand(self, node, b, player):
+        """
+        Allocate the children of node, one per legal move of player on b.
+        """
+        moves = squares(legal_moves(b, player), b.size)
+        self._reserve(len(moves))
+        first = self.count
+        end = first + len(moves)
+        self.move[first:end] = moves
+        self.parent[first:end] = node
+        self.first_child[node] = first
+        self.child_count[node] = len(moves)
+        self.count = end
+
+    def descend(self, alpha):
+        """
+        Walk from the root down the children with the highest UCT value
+        until a terminal node or a node with untried children, then step into
+        its next untried child. Nodes are expanded on the way when first
+        needed.
+
+        Returns:
+            path (list): Node indices from the root to the node to simulate
+            b (Board): Position of that node
+            player: The color to move there
+        """
+        node = self.root
+        b = self.board
+        player = self.player
+        path = [node]
+        while True:
+            if self.first_child[node] < 0:
+                self._expand(node, b, player)
+            first = int(self.first_child[node])
+            count = int(self.child_count[node])
+            if not count:
+                return path, b, player
+            tried = int(self.tried[node])
+            if tried < count:
+                self.tried[node] = tried + 1
+                node = first + tried
+            else:
+                node = self._best_child(node, first, count, alpha)
+            b = play(b, player, int(self.move[node]))
+            player = 1 if player == 2 else 2
+            path.append(node)
+            if not self.N[node]:
+                return path, b, player
+
+    def _means(self, first, count):
+        return self.value[first:first + count] / self.N[first:first + count]
+
+    def _visits(self, node):
+        return self.N[node]
+
+    def _best_child(self, node, first, count, alpha):
+        """
+        Return the child of node with the highest UCT value, the mean value
+        blended with the AMAF mean if RAVE is on.
+        """
+        n = self.N[first:first + count]
+        q = self._means(first, count)
+        if self.rave_k:
+            amaf_n = self.amaf_N[first:first + count]
+            amaf_q = np.where(amaf_n > 0, self.amaf_value[first:first + count] / np.maximum(amaf_n, 1), q)
+            beta = np.sqrt(self.rave_k / (3 * n + self.rave_k))
+            q = (1 - beta) * q + beta * amaf_q
+        uct = q + alpha * np.sqrt(np.log(self._visits(node)) / n)
+        return first + int(np.argmax(uct))
+
+    def backprop(self, path, utility, count=1, played=None):
+        """
+        Add count visits and the summed utility of count rollouts to the
+        nodes of path, from the point of view of the player who moved into
+        each node. played, the squares of the playout by color as returned
+        by random_playout_moves, updates the AMAF statistics.
+        """
+        path = np.array(path)
+        sign = -1 if self.player == 1 else 1
+        signs = np.where(np.arange(len(path)) % 2, -sign, sign)
+        self.N[path] += count
+        self.value[path] += utility * signs
+        if self.rave_k and played is not None:
+            self._amaf(path, path, utility, played)
+
+    def _amaf(self, path, nodes, utility, played):
+        """
+        Update the AMAF statistics of the edges out of nodes, the nodes of
+        the edges of path, with a playout of utility.
+        """
+        squares_played = (None, np.zeros(self.board.size ** 2, dtype=bool),
+                          np.zeros(self.board.size ** 2, dtype=bool))
+        for color in (1, 2):
+            squares_played[color][played[color]] = True
+        other = 1 if self.player == 2 else 2
+        for k in range(len(path) - 1, -1, -1):
+            node = nodes[k]
+            player = self.player if k % 2 == 0 else other
+            first = int(self.first_child[node])
+            if first >= 0:
+                block = slice(first, first + int(self.child_count[node]))
+                hit = first + np.flatnonzero(squares_played[player][self.move[block]])
+                self.amaf_N[hit] += 1
+                self.amaf_value[hit] += utility if player == 1 else -utility
+            if k:
+                squares_played[other if k % 2 == 0 else self.player][self.move[path[k]]] = True
+
+    def children(self, node=None):
+        """
+        Return the indices of the children of node (by default the root).
+        """
+        node = self.root if node is None else node
+        first = int(self.first_child[node])
+        if first < 0:
+            return range(0)
+        return range(first, first + int(self.child_count[node]))
+
+    def root_stats(self):
+        """
+        Return the (N, value) of every visited root child, keyed by (column,row) move.
+        """
+        size = self.board.size
+        return {coordinates(int(self.move[c]), size): (int(self.N[c]), int(self.value[c]))
+                for c in self.children() if self.N[c]}
+
+    def advance(self, b, player):
+        """
+        Make the node of Board b with player to move the new root, if it is
+        the root, a child or a grandchild of the current root, and drop the
+        rest of the tree.
+
+        Returns:
+            found (bool): False if b is not in the tree, which is then unchanged
+        """
+        if player == self.player and b == self.board:
+            return True
+        next_player = 1 if self.player == 2 else 2
+        found = None
+        for child in self.children():
+            child_board = play(self.board, self.player, int(self.move[child]))
+            if player == next_player and child_board == b:
+                found = child
+            elif player == self.player:
+                for grandchild in self.children(child):
+                    if play(child_board, next_player, int(self.move[grandchild])) == b:
+                        found = grandchild
+                        break
+            if found is not None:
+                break
+        if found is None:
+            return False
+        self._compact(found)
+        self.board = b
+        self.player = player
+        return True
+
+    def _compact(self, root):
+        """
+        Copy the subtree of root to the front of the arrays, level by level,
+        so that it becomes the whole tree with root at index 0.
+        """
+        levels = []
+        firsts = []
+        nodes = np.array([root])
+        start = 0
+        while len(nodes):
+            levels.append(nodes)
+            first = self.first_child[nodes].astype(np.int64)
+            counts = np.where(first >= 0, self.child_count[nodes], 0).astype(np.int64)
+            next_start = start + len(nodes)
+            ends = np.cumsum(counts)
+            firsts.append(np.where(first >= 0, next_start + ends - counts, -1))
+            # The children of all nodes of the level, block after block
+            offsets = np.repeat(first - (ends - counts), counts)
+            nodes = offsets + np.arange(ends[-1] if len(ends) else 0)
+            start = next_start
+        order = np.concatenate(levels)
+        new_index = np.full(self.count, -1, dtype=np.int64)
+        new_index[order] = np.arange(len(order))
+        parent = self.parent[order]
+        parent = np.where(parent >= 0, new_index[np.maximum(parent, 0)], -1)
+        parent[0] = -1
+        n = len(order)
+        for name, _, fill in self.FIELDS:
+            a = getattr(self, name)
+            if name not in ("parent", "first_child"):
+                a[:n] = a[order]
+            a[n:self.count] = fill
+        self.parent[:n] = parent
+        self.first_child[:n] = np.concatenate(firsts)
+        self.root = 0
+        self.count = n
+
+
+class TranspositionTree(Tree):
+    """
+    MCTS graph of the position Board b with player to move, sharing the
+    node of every position among all paths leading to it.
+
+    Node data (children, node_N, node_value) lives at the index of the
+    edge that first reached the position; target maps every edge to that
+    index. advance compacts the graph to the part reachable from the new
+    root.
+    """
+
+    FIELDS = Tree.FIELDS + (("target", np.int32, -1), ("node_N", np.int32, 0),
+                            ("node_value", np.int64, 0))
+
+    def __init__(self, b, player, capacity=4096, rave_k=None):
+        Tree.__init__(self, b, player, capacity, rave_k)
+        self.target[0] = 0
+        self.node_N[0] = 1
+        self.table = {b: 0}
+        self.hits = 0
+
+    def descend(self, alpha):
+        """
+        Walk from the root down the edges with the highest UCT value until
+        a terminal node or a node with untried edges, then take its next
+        untried edge, joining the node of its position if there is one.
+
+        Returns:
+            path (list): Edge indices from the root to the position to simulate
+            b (Board): That position
+            player: The color to move there
+        """
+        node = self.root
+        b = self.board
+        player = self.player
+        path = [node]
+        while True:
+            if self.first_child[node] < 0:
+                self._expand(node, b, player)
+            first = int(self.first_child[node])
+            count = int(self.child_count[node])
+            if not count:
+                return path, b, player
+            tried = int(self.tried[node])
+            if tried < count:
+                self.tried[node] = tried + 1
+                edge = first + tried
+            else:
+                edge = self._best_child(node, first, count, alpha)
+            b = play(b, player, int(self.move[edge]))
+            player = 1 if player == 2 else 2
+            path.append(edge)
+            if tried < count:
+                node = self.table.get(b)
+                if node is None:
+                    node = self.table[b] = edge
+                else:
+                    self.hits += 1
+                self.target[edge] = node
+                return path, b, player
+            node = int(self.target[edge])
+
+    def _means(self, first, count):
+        targets = self.target[first:first + count]
+        return self.node_value[targets] / self.node_N[targets]
+
+    def _visits(self, node):
+        return self.node_N[node]
+
+    def backprop(self, path, utility, count=1, played=None):
+        """
+        Add count visits and the summed utility of count rollouts to the
+        edges of path and to the nodes they lead to, and the playout played
+        to the AMAF statistics.
+        """
+        path = np.array(path)
+        nodes = self.target[path]
+        sign = -1 if self.player == 1 else 1
+        signs = np.where(np.arange(len(path)) % 2, -sign, sign)
+        self.N[path] += count
+        self.value[path] += utility * signs
+        self.node_N[nodes] += count
+        self.node_value[nodes] += utility * signs
+        if self.rave_k and played is not None:
+            self._amaf(path, nodes, utility, played)
+
+    def advance(self, b, player):
+        """
+        Make the node of Board b with player to move the new root, if b is
+        in the graph, and forget the positions that can no longer occur.
+
+        Returns:
+            found (bool): False if b is not in the graph, which is then unchanged
+        """
+        node = self.table.get(b)
+        if node is None:
+            return False
+        new_index = self._compact(node)
+        self.board = b
+        self.player = player
+        self.table = {k: int(new_index[v]) for k, v in self.table.items() if new_index[v] >= 0}
+        return True
+
+    def _compact(self, root):
+        """
+        Copy the part of the graph reachable from node root to the front of
+        the arrays, with root at index 0: the child blocks of the reachable
+        nodes level by level, then the reachable nodes whose own edge is
+        not in those blocks.
+
+        Returns:
+            new_index (ndarray): The new index of every old one, -1 if dropped
+        """
+        parts = [np.array([root])]
+        levels = []
+        nodes = parts[0]
+        start = 1
+        while len(nodes):
+            first = self.first_child[nodes].astype(np.int64)
+            counts = np.where(first >= 0, self.child_count[nodes], 0).astype(np.int64)
+            ends = np.cumsum(counts)
+            levels.append((nodes, np.where(first >= 0, start + ends - counts, -1)))
+            edges = np.repeat(first - (ends - counts), counts) + np.arange(ends[-1])
+            parts.append(edges)
+            start += len(edges)
+            targets = self.target[edges]
+            # Every path to a position has the same length, so its node is on one level
+            nodes = np.unique(targets[targets >= 0])
+        placed = np.zeros(self.count, dtype=bool)
+        placed[np.concatenate(parts)] = True
+        reached = np.concatenate([level for level, _ in levels])
+        order = np.concatenate(parts + [reached[~placed[reached]]])
+        new_index = np.full(self.count, -1, dtype=np.int64)
+        new_index[order] = np.arange(len(order))
+
+        def remap(a):
+            return np.where(a >= 0, new_index[np.maximum(a, 0)], -1)
+        parent = remap(self.parent[order])
+        target = remap(self.target[order])
+        n = len(order)
+        for name, _, fill in self.FIELDS:
+            a = getattr(self, name)
+            if name not in ("parent", "target"):
+                a[:n] = a[order]
+            a[n:self.count] = fill
+        self.parent[:n] = parent
+        self.target[:n] = target
+        for level, firsts in levels:
+            self.first_child[new_index[level]] = firsts
+        self.root = 0
+        self.count = n
+        return new_index
+
+
+def measure_trees(b, rollouts):
+    """
+    Grow a Tree and a TranspositionTree from Board b with rollouts rollouts
+    each, and report their memory per node and the time spent outside the
+    simulations (selection, expansion and backpropagation).
+    """
+    for cls in (Tree, TranspositionTree):
+        tree = cls(b, 1)
+        walk = 0.0
+        for _ in range(rollouts):
+            start = time.perf_counter()
+            path, leaf_board, player = tree.descend(5)
+            walk += time.perf_counter() - start
+            utility = random_playout(leaf_board, player)
+            start = time.perf_counter()
+            tree.backprop(path, utility)
+            walk += time.perf_counter() - start
+        print("{}: {} nodes ({} visited), {} bytes/node, {:.1f} us/rollout in the tree".format(
+            cls.__name__, len(tree), int((tree.N[:len(tree)] > 0).sum()), tree.bytes_per_node(),
+            walk / rollouts * 1e6))
+
+
+def compare_transpositions(size, rollouts, positions, empties):
+    """
+    Search random positions with empties empty squares with a Tree and a
+    TranspositionTree, and count how often the most visited move is one of
+    the best moves according to the exact endgame solver.
+    """
+    from endgame import solve
+
+    stats = {Tree: [0, 0, 0], TranspositionTree: [0, 0, 0]}   # nodes, hits, best moves
+    found = 0
+    while found < positions:
+        b = initial_board(size)
+        player = 1
+        while size * size - popcount(b.dark | b.light) > empties and legal_moves(b, player):
+            b = play(b, player, random.choice(list(iter_squares(legal_moves(b, player)))))
+            player = 1 if player == 2 else 2
+        moves = legal_moves(b, player)
+        if popcount(moves) < 2 or size * size - popcount(b.dark | b.light) != empties:
+            continue
+        found += 1
+        values = {}
+        own, opp = (b.dark, b.light) if player == 1 else (b.light, b.dark)
+        for sq in iter_squares(moves):
+            after = play(b, player, sq)
+            a_own, a_opp = (after.light, after.dark) if player == 1 else (after.dark, after.light)
+            values[sq] = -solve(a_own, a_opp, size, -size * size, size * size, empties - 1)
+        best = max(values.values())
+        for cls in (Tree, TranspositionTree):
+            tree = cls(b, player)
+            for _ in range(rollouts):
+                path, leaf_board, leaf_player = tree.descend(5)
+                tree.backprop(path, random_playout(leaf_board, leaf_player))
+            move = max(tree.children(), key=lambda c: tree.N[c])
+            stats[cls][0] += len(tree)
+            stats[cls][1] += getattr(tree, "hits", 0)
+            stats[cls][2] += values[int(tree.move[move])] == best
+    for cls, (nodes, hits, correct) in stats.items():
+        print("{}: {:.0f} nodes/search, {:.0f} transpositions/search, best move in {}/{} positions".format(
+            cls.__name__, nodes / positions, hits / positions, correct, positions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the MCTS tree implementations")
+    parser.add_argument("-b", default=8, type=int, help="Board size (default 8x8)")
+    parser.add_argument("--rollouts", default=5000, type=int, help="Rollouts per tree (default 5000)")
+    parser.add_argument(
+        "--positions", default=0, type=int,
+        help="Compare Tree and TranspositionTree on this many solved endgame positions instead"
+    )
+    parser.add_argument("--empties", default=10, type=int, help="Empty squares of those positions (default 10)")
+    args = parser.parse_args()
+
+    if args.positions:
+        compare_transpositions(args.b, args.rollouts, args.positions, args.empties)
+    else:
+        measure_trees(initial_board(args.b), args.rollouts)
+
+
+if __name__ == "__main__":
+    main()
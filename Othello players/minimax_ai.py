@@ -4,116 +4,482 @@
 Alpha-beta minimax AI player for Othello.
 """
 
-import numpy as np
+import argparse
+import sys
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
 from six.moves import input
-from othello_shared import get_possible_moves, play_move, compute_utility
+from othello_bitboard import Board, from_array, legal_moves, play, squares, coordinates, popcount
+from evaluation import evaluate, final_value
+from ordering import MoveOrdering
+from endgame import endgame_move
+from opening_book import book_move
+from worker_pool import get_pool
+from protocol import introduction, parse_color, read_board
+from search_stats import SearchStats, rate
+from othello_game import AiPlayerInterface
+from transposition import TranspositionTable, zobrist_hash, zobrist_update, EXACT, LOWER, UPPER
 
+# Share of AiPlayerInterface.TIMEOUT a move may use; the rest covers the
+# process and pipe overhead on the game manager side.
+TIME_FRACTION = 0.5
+# No new iteration is started once this share of the move budget is used up,
+# since the next depth usually costs several times the previous ones.
+SOFT_FRACTION = 0.3
 
-def max_value(state, player, alpha, beta):
+# Kept for the whole life of the AI process, so results carry over between moves
+transposition_table = TranspositionTable()
+move_ordering = MoveOrdering()
+# Factories of the state above, for a fresh copy per in-process player
+# (see othello_game.InProcessPlayer)
+PLAYER_STATE = {"transposition_table": TranspositionTable, "move_ordering": MoveOrdering}
+
+# Parallel root searches only pay off when the subtrees are big enough
+PARALLEL_MIN_DEPTH = 4
+
+# Hard deadline (time.time()) of the running search, None for no limit
+deadline = None
+# True during a parallel root search, which only uses table entries of
+# exactly the requested depth (see probe)
+exact_depth = False
+# Nodes visited and leaves evaluated in this process since the last new_search()
+nodes = 0
+leaves = 0
+# Phase times of the last move, nodes visited when each of its iterations
+# completed, and the table and ordering counters when it started
+move_stats = SearchStats()
+iterations = []
+start_counts = (0, 0, 0, 0)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def probe(key, alpha, beta, depth):
+    """
+    Look up key in the transposition table and, if the stored search was
+    at least depth plies deep, narrow the window with the stored bound.
+    With exact_depth, only entries of exactly depth plies are used. Every
+    value is then a function of the position and depth alone, so the result
+    does not depend on the order in which the workers visit positions.
+
+    Returns:
+        value (int): Stored value, or None if the window is still open
+        alpha, beta: Narrowed window
+        move (int): Stored best move, to be searched first, or None
+    """
+    entry = transposition_table.probe(key)
+    if entry is None:
+        return None, alpha, beta, None
+    value, flag, stored_depth, move = entry
+    if stored_depth < depth or (exact_depth and stored_depth != depth):
+        return None, alpha, beta, move
+    if flag == EXACT:
+        return (value, move), alpha, beta, move
+    if flag == LOWER:
+        alpha = max(alpha, value)
+    else:
+        beta = min(beta, value)
+    if alpha >= beta:
+        return (value, move), alpha, beta, move
+    return None, alpha, beta, move
+
+
+def store(key, value, move, alpha, beta, depth):
+    """
+    Store a search result, with its bound type derived from the searched window.
+    """
+    if value <= alpha:
+        flag = UPPER
+    elif value >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    transposition_table.store(key, value, flag, depth, move)
+
+
+def child_key(key, state, next_state, player, n):
+    if player == 1:
+        flipped = state.light & ~next_state.light
+    else:
+        flipped = state.dark & ~next_state.dark
+    return zobrist_update(key, state.size, player, n, flipped)
+
+
+def max_value(state, player, alpha, beta, key, depth):
     """
     Args:
-        state: Board state
+        state (Board): Bitboard state
         player: Dark (1) or light (2)
         alpha, beta values
+        key (int): Zobrist hash of state with player to move
+        depth (int): Remaining plies; positions at depth 0 are scored by evaluate
 
     Returns:
         value (int): Minimax value of state
-        move (tuple): Best move to make
+        move (int): Square of the best move to make
     """
+    global nodes, leaves
+    nodes += 1
+    if deadline is not None and time.time() > deadline:
+        raise SearchTimeout
     
-    moves = get_possible_moves(state, player)
+    moves = legal_moves(state, player)
     if not moves:
-        return compute_utility(state), None
+        return final_value(state), None
+    if depth == 0:
+        leaves += 1
+        return evaluate(state, player, moves), None
+
+    hit, alpha, beta, hash_move = probe(key, alpha, beta, depth)
+    if hit is not None:
+        return hit
+    alpha0, beta0 = alpha, beta
 
     optimal_val = -float("inf")
     optimal_move = None
-    for n in moves:
-        next_state = play_move(state,player,n[0],n[1])
+    for index, n in enumerate(move_ordering.order(state, player, moves, hash_move)):
+        next_state = play(state, player, n)
         if player == 2:
             next_player =1
         else:
             next_player = 2
-        value, _ = min_value(next_state,next_player,alpha,beta)
+        value, _ = min_value(next_state,next_player,alpha,beta,child_key(key,state,next_state,player,n),depth-1)
         if value > optimal_val:
             optimal_val = value
             optimal_move = n
         if optimal_val >= beta:
-            return optimal_val, optimal_move
+            move_ordering.cutoff(state, player, n, depth, index)
+            break
         alpha = max(alpha, optimal_val)
     
+    store(key, optimal_val, optimal_move, alpha0, beta0, depth)
     return optimal_val, optimal_move
 
 
-def min_value(state, player, alpha, beta):
+def min_value(state, player, alpha, beta, key, depth):
     """
     Args:
-        state: Board state
+        state (Board): Bitboard state
         player: Dark (1) or light (2)
         alpha, beta values
+        key (int): Zobrist hash of state with player to move
+        depth (int): Remaining plies; positions at depth 0 are scored by evaluate
 
     Returns:
         value (int): Minimax value of state
-        move (tuple): Best move to make
+        move (int): Square of the best move to make
     """
-    moves = get_possible_moves(state, player)
+    global nodes, leaves
+    nodes += 1
+    if deadline is not None and time.time() > deadline:
+        raise SearchTimeout
+    moves = legal_moves(state, player)
     if not moves:
-        return compute_utility(state), None
+        return final_value(state), None
+    if depth == 0:
+        leaves += 1
+        return evaluate(state, player, moves), None
+
+    hit, alpha, beta, hash_move = probe(key, alpha, beta, depth)
+    if hit is not None:
+        return hit
+    alpha0, beta0 = alpha, beta
 
     optimal_val = float("inf")
     optimal_move = None
-    for n in moves:
-        next_state = play_move(state,player,n[0],n[1])
+    for index, n in enumerate(move_ordering.order(state, player, moves, hash_move)):
+        next_state = play(state, player, n)
         if player == 2:
             next_player =1
         else:
             next_player = 2
-        value, _ = max_value(next_state,next_player,alpha,beta)
+        value, _ = max_value(next_state,next_player,alpha,beta,child_key(key,state,next_state,player,n),depth-1)
         if value<optimal_val:
             optimal_val = value
             optimal_move = n
         if optimal_val <= alpha:
-            return optimal_val, optimal_move
+            move_ordering.cutoff(state, player, n, depth, index)
+            break
         beta = min(beta, optimal_val)
+    store(key, optimal_val, optimal_move, alpha0, beta0, depth)
     return optimal_val, optimal_move
 
 
-def minimax(state, player):
+def new_search():
+    """
+    Prepare the tables kept between moves for the search of a new move.
+    """
+    global nodes, leaves, move_stats, iterations, start_counts
+    nodes = leaves = 0
+    move_stats = SearchStats()
+    iterations = []
+    start_counts = search_counts()
+    transposition_table.new_search()
+    move_ordering.new_search()
+
+
+def search_counts():
+    return (transposition_table.probes, transposition_table.hits,
+            move_ordering.cutoffs, move_ordering.first_move_cutoffs)
+
+
+def search_summary(depth, workers=1):
+    """
+    Return the statistics of the last move, searched to depth, as one line.
+    Nodes searched by worker processes are not counted, so with more than
+    one worker the node counts are labelled as those of the main process.
+    """
+    if "search" in dict(move_stats.phases):
+        probes, hits, cutoffs, first = (now - before for now, before in zip(search_counts(), start_counts))
+        own = " (main process)" if workers > 1 else ""
+        move_stats.add("depth", depth)
+        move_stats.add("nodes" + own, nodes)
+        move_stats.add("leaves" + own, leaves)
+        move_stats.add("nps" + own, rate(nodes, move_stats.seconds("search")), "{:.0f}")
+        if len(iterations) > 2 and workers == 1:
+            last, previous = iterations[-1] - iterations[-2], iterations[-2] - iterations[-3]
+            move_stats.add("ebf", last / max(previous, 1), "{:.1f}")
+        move_stats.add("cutoffs", cutoffs)
+        move_stats.add("first move", first / cutoffs if cutoffs else 0.0, "{:.1%}")
+        move_stats.add("TT hits", hits / probes if probes else 0.0, "{:.1%}")
+    elif depth:
+        move_stats.add("solved", "{} empties".format(depth))
+    else:
+        move_stats.add("move from", "book")
+    return move_stats.summary("Minimax")
+
+
+def search(state, player, depth):
+    """
+    Search state to a fixed depth.
+
+    Returns:
+        value (int): Minimax value of state
+        move (int): Square of the best move to make
+    """
+    key = zobrist_hash(state, player)
+    if player == 1:
+        return max_value(state, player, -float('inf'), float('inf'), key, depth)
+    return min_value(state, player, -float('inf'), float('inf'), key, depth)
+
+
+def search_root_move(state, player, n, depth, alpha, beta, stop_time):
+    """
+    Search the root move n of state with the given window, in a worker
+    process of the parallel search.
+
+    Returns:
+        value (int): Value of the move, or None if stop_time passed
+    """
+    global deadline, exact_depth
+    deadline, exact_depth = stop_time, True
+    next_state = play(state, player, n)
+    next_player = 1 if player == 2 else 2
+    key = zobrist_hash(next_state, next_player)
+    try:
+        if player == 1:
+            value, _ = min_value(next_state, next_player, alpha, beta, key, depth - 1)
+        else:
+            value, _ = max_value(next_state, next_player, alpha, beta, key, depth - 1)
+        return value
+    except SearchTimeout:
+        return None
+    finally:
+        deadline, exact_depth = None, False
+
+
+def parallel_search(state, player, depth, workers):
+    """
+    Search state to a fixed depth, splitting the root moves over worker
+    processes (Young Brothers Wait at the root).
+
+    The first move in search order is searched here to get a bound. The
+    others are handed out to the workers, each with a window narrowed to the
+    best value known when it is sent. Moves are sent in search order, so a
+    move must beat the best value to replace it, as in the serial search,
+    unless it comes before the current best one in search order and ties
+    with it. The result is therefore the first move in search order with
+    the highest value, the same as search() with exact_depth set.
+
+    Returns:
+        value (int): Minimax value of state
+        move (int): Square of the best move to make
+    """
+    global exact_depth
+    moves = legal_moves(state, player)
+    if not moves:
+        return final_value(state), None
+    exact_depth = True
+    pending = {}
+    try:
+        key = zobrist_hash(state, player)
+        hit, _, _, hash_move = probe(key, -float('inf'), float('inf'), depth)
+        if hit is not None:
+            return hit
+        order = move_ordering.order(state, player, moves, hash_move)
+        sign = 1 if player == 1 else -1
+        next_player = 1 if player == 2 else 2
+
+        next_state = play(state, player, order[0])
+        next_key = child_key(key, state, next_state, player, order[0])
+        if player == 1:
+            best_value, _ = min_value(next_state, next_player, -float('inf'), float('inf'), next_key, depth - 1)
+        else:
+            best_value, _ = max_value(next_state, next_player, -float('inf'), float('inf'), next_key, depth - 1)
+        best_index = 0
+
+        executor = get_pool(workers)
+        index = 1
+        while pending or index < len(order):
+            while index < len(order) and len(pending) < workers:
+                alpha, beta = (best_value, float('inf')) if player == 1 else (-float('inf'), best_value)
+                future = executor.submit(search_root_move, state, player, order[index],
+                                         depth, alpha, beta, deadline)
+                pending[future] = (index, best_value)
+                index += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, bound = pending.pop(future)
+                value = future.result()
+                if value is None:
+                    raise SearchTimeout
+                # Values not strictly inside the window are only bounds,
+                # and then the move is not better than the best one
+                if sign * value > sign * bound and \
+                        (sign * value > sign * best_value or (value == best_value and i < best_index)):
+                    best_value, best_index = value, i
+    finally:
+        exact_depth = False
+        for future in pending:
+            future.cancel()
+
+    store(key, best_value, order[best_index], -float('inf'), float('inf'), depth)
+    return best_value, order[best_index]
+
+
+def root_search(state, player, depth, workers=1):
+    if workers > 1 and depth >= PARALLEL_MIN_DEPTH:
+        return parallel_search(state, player, depth, workers)
+    return search(state, player, depth)
+
+
+def iterative_deepening(state, player, time_limit, workers=1):
+    """
+    Search state one ply deeper at a time until time_limit seconds are used
+    up or the game tree is searched to the end. An iteration that runs past
+    the deadline is abandoned, so the result always comes from the last
+    completed depth. Book positions are answered from the opening book,
+    and endgame positions are first given to the exact solver, with half of
+    the time. If it gives up, the search gets the time that is left, and
+    its soft deadline is a share of that time.
+
+    Returns:
+        move (int): Square of the best move to make
+        depth (int): Depth of the last completed iteration, 0 for book moves
+    """
+    global deadline
+    best_move = book_move(state, player)
+    move_stats.phase("book")
+    if best_move is not None:
+        return best_move, 0
+    start = time.time()
+    empties = state.size * state.size - popcount(state.dark | state.light)
+    best_move = endgame_move(state, player, time_limit / 2)
+    move_stats.phase("endgame")
+    if best_move is not None:
+        return best_move, empties
+    now = time.time()
+    remaining = start + time_limit - now
+    soft_deadline = now + SOFT_FRACTION * remaining
+    deadline = now + remaining
+    best_move, reached = None, 0
+    try:
+        for depth in range(1, empties + 1):
+            _, best_move = root_search(state, player, depth, workers)
+            reached = depth
+            iterations.append(nodes)
+            if time.time() > soft_deadline:
+                break
+    except SearchTimeout:
+        pass
+    finally:
+        deadline = None
+        move_stats.phase("search")
+    if best_move is None:
+        best_move = squares(legal_moves(state, player), state.size)[0]
+    return best_move, reached
+
+
+def minimax(state, player, depth=None, time_limit=None, workers=1):
     """
     Minimax main loop
     Call max_value if player is 1 (dark), min_value if player is 2 (light)
-    Then return the resultant move
+    Then return the resultant (column, row) move
+
+    With depth, search exactly depth plies. Otherwise deepen iteratively
+    within time_limit seconds (by default a share of AiPlayerInterface.TIMEOUT).
+    With more than one worker, root moves are searched in parallel processes.
     """
-    if player == 1:
-        _, move = max_value(state, player, -float('inf'), float('inf'))
+    if not isinstance(state, Board):
+        state = from_array(state)
+    new_search()
+    if depth is not None:
+        _, move = root_search(state, player, depth, workers)
     else:
-        _, move = min_value(state, player, -float('inf'), float('inf'))
-    return move
+        if time_limit is None:
+            time_limit = TIME_FRACTION * AiPlayerInterface.TIMEOUT
+        move, _ = iterative_deepening(state, player, time_limit, workers)
+    return coordinates(move, state.size)
 
 
 ####################################################
-def run_ai():
+def run_ai(workers=1, show_stats=False):
     """
     This function establishes communication with the game manager.
     It first introduces itself and receives its color.
     Then it repeatedly receives the current score and current board state
     until the game is over.
+    With show_stats, the search statistics of every move go to stderr.
     """
-    print("Minimax AI")     # First line is the name of this AI
-    color = int(input())    # 1 for dark (first), 2 for light (second)
+    print(introduction("Minimax AI"))       # First line is the name of this AI
+    color, protocol = parse_color(input())  # 1 for dark (first), 2 for light (second)
 
     while True:
         # Read in the current game status, for example:
-        # "SCORE 2 2" or "FINAL 33 31" if the game is over.
+        # "SCORE 2 2" or "FINAL 33 31" if the game is over,
+        # then possibly "NEWGAME 2" to play another game as light.
         next_input = input()
-        status, dark_score_s, light_score_s = next_input.strip().split()
+        status = next_input.split()[0]
 
-        if status == "FINAL":
+        if status == "NEWGAME":
+            color = int(next_input.split()[1])
+        elif status == "FINAL":
             print()
         else:
-            board = np.array(eval(input()))
-            movei, movej = minimax(board, color)
+            board = read_board(protocol)
+            new_search()
+            start = time.time()
+            move, depth = iterative_deepening(board, color, TIME_FRACTION * AiPlayerInterface.TIMEOUT, workers)
+            movei, movej = coordinates(move, board.size)
             print("{} {}".format(movei, movej))
+            if show_stats:
+                sys.stderr.write(search_summary(depth, workers) + "\n")
+            elif depth == 0:
+                sys.stderr.write("Minimax: book move\n")
+            else:
+                sys.stderr.write("Minimax: depth {} in {:.2f}s. {}. {}\n".format(
+                    depth, time.time() - start, transposition_table.report(), move_ordering.report()))
 
 
 if __name__ == "__main__":
-    run_ai()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Alpha-beta minimax AI player for Othello")
+    parser.add_argument(
+        "--workers", default=1, type=int, help="Processes for the parallel root search (default 1)"
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="Print nodes, cutoffs, TT hits and phase times of every move to stderr"
+    )
+    args = parser.parse_args()
+    run_ai(args.workers, args.stats)
\ No newline at end of file
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Unit tests for the alpha-beta player
+"""
+
+import random
+import time
+import minimax_ai
+from evaluation import evaluate, final_value
+from othello_bitboard import Board, initial_board, legal_moves, play, iter_squares, popcount
+
+
+def random_position(size, empties, seed=0):
+    """
+    Return (board, player) after random moves from the initial board, with
+    empties empty squares and a legal move for player.
+    """
+    rng = random.Random(seed)
+    while True:
+        b, player = initial_board(size), 1
+        while legal_moves(b, player) and size * size - popcount(b.dark | b.light) > empties:
+            b = play(b, player, rng.choice(list(iter_squares(legal_moves(b, player)))))
+            player = 1 if player == 2 else 2
+        if legal_moves(b, player):
+            return b, player
+
+
+def test_endgame_fallback():
+    """
+    When the endgame solver gives up after its half of the time, the search
+    still gets the rest and goes deeper than one ply.
+    """
+    def slow_solver(b, player, time_limit=None):
+        time.sleep(time_limit)
+        return None
+
+    b, player = random_position(8, 14)
+    solver = minimax_ai.endgame_move
+    minimax_ai.endgame_move = slow_solver
+    try:
+        minimax_ai.new_search()
+        start = time.time()
+        move, depth = minimax_ai.iterative_deepening(b, player, 1.0)
+        elapsed = time.time() - start
+    finally:
+        minimax_ai.endgame_move = solver
+    ok = depth > 1 and legal_moves(b, player) >> move & 1 and elapsed < 1.2
+    print("iterative_deepening() after failed solve test {}".format("passed" if ok else "failed"))
+
+
+def test_final_value():
+    """
+    A game won by one disc outranks the heuristic score of every position,
+    on every board size up to 16x16.
+    """
+    # A 16x16 position with a heuristic score of 1234
+    extreme = Board(0xffff80008001800180018001800180418801822180018001800180010001bfff,
+                    0x7fff4d244a404472559643d279a2557e6d0245724c464b220452fffe4000, 16)
+    ok = evaluate(extreme, 1, legal_moves(extreme, 1)) < final_value(Board(1, 0, 16))
+    for size in (4, 8, 12, 16):
+        won = final_value(Board(1, 0, size))
+        for empties in range(1, size * size - 4, size):
+            b, player = random_position(size, empties, seed=empties)
+            for side in (1, 2):
+                ok = ok and abs(evaluate(b, side, legal_moves(b, side))) < won
+    print("final_value() test {}".format("passed" if ok else "failed"))
+
+
+def test_search_counters():
+    """
+    The counters of a fixed-depth search are consistent with each other.
+    """
+    b, player = random_position(8, 44)
+    minimax_ai.minimax(b, player, depth=4)
+    probes, hits, cutoffs, first = (now - before for now, before in
+                                    zip(minimax_ai.search_counts(), minimax_ai.start_counts))
+    ok = minimax_ai.nodes >= minimax_ai.leaves > 0 and cutoffs >= first and probes > 0 and 0 <= hits / probes <= 1
+    print("search counters test {}".format("passed" if ok else "failed"))
+
+
+def main():
+    test_endgame_fallback()
+    test_final_value()
+    test_search_counters()
+
+
+if __name__ == "__main__":
+    main()
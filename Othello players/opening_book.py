@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Precomputed opening book.
+
+The builder visits every position up to a number of plies from the initial
+board, searches each one with minimax_ai to a fixed depth and writes the
+best moves to a binary file. The AI players memory-map the file and look
+positions up by binary search, so opening a book reads nothing but the
+header and a lookup only touches a few pages.
+
+File format (little endian):
+
+    magic     8 bytes  b"OTHBOOK1"
+    size      uint32   board dimension
+    count     uint32   number of positions
+    keys      count x uint64, sorted: Zobrist hash of position and side to move
+    scores    count x int32: search value, positive if dark is better
+    moves     count x int16: square (j * size + i) of the best move
+
+Usage: python opening_book.py -b 8 --plies 6 --depth 6
+"""
+import argparse
+import os
+import struct
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from othello_bitboard import initial_board, legal_moves, play, iter_squares
+from transposition import zobrist_hash
+
+MAGIC = b"OTHBOOK1"
+HEADER = struct.Struct("<8sII")
+
+
+def book_path(size):
+    """
+    Return the default path of the book for a board size, next to this module.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "book_{0}x{0}.bin".format(size))
+
+
+class OpeningBook(object):
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, self.size, self.count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not an opening book".format(path))
+        offset = HEADER.size
+        self.keys = np.memmap(path, dtype="<u8", mode="r", offset=offset, shape=(self.count,))
+        offset += 8 * self.count
+        self.scores = np.memmap(path, dtype="<i4", mode="r", offset=offset, shape=(self.count,))
+        offset += 4 * self.count
+        self.moves = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(self.count,))
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, key):
+        """
+        Returns:
+            entry (tuple): (move, score) of the position with hash key, or None
+        """
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+        if i < self.count and self.keys[i] == key:
+            return int(self.moves[i]), int(self.scores[i])
+        return None
+
+
+@lru_cache(maxsize=None)
+def load_book(size):
+    """
+    Open the default book for a board size, or return None if there is none
+    or it has no entries.
+    """
+    path = book_path(size)
+    if not os.path.exists(path) or os.path.getsize(path) <= HEADER.size:
+        return None
+    return OpeningBook(path)
+
+
+def book_move(b, player):
+    """
+    Return the book move (a square) for Board b with player to move, or None
+    if the position is not in the book or the stored move is not legal there
+    (a hash collision or a corrupt book), so that the caller searches.
+    """
+    book = load_book(b.size)
+    if book is None or not len(book):
+        return None
+    entry = book.lookup(zobrist_hash(b, player))
+    if entry is None or not 0 <= entry[0] < b.size * b.size or not legal_moves(b, player) >> entry[0] & 1:
+        return None
+    return entry[0]
+
+
+def write_book(path, size, entries):
+    """
+    Write entries, a dict from position hash to (move, score), to path.
+    """
+    keys = np.array(sorted(entries), dtype="<u8")
+    scores = np.array([entries[k][1] for k in keys.tolist()], dtype="<i4")
+    moves = np.array([entries[k][0] for k in keys.tolist()], dtype="<i2")
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, size, len(keys)))
+        f.write(keys.tobytes())
+        f.write(scores.tobytes())
+        f.write(moves.tobytes())
+
+
+def build_book(size, plies, depth, workers=1):
+    """
+    Search every position reachable in at most plies moves from the initial
+    board to the given depth.
+
+    Returns:
+        entries (dict): Position hash to (move, score)
+    """
+    import minimax_ai   # here, since minimax_ai itself reads books
+
+    entries = {}
+    frontier = [(initial_board(size), 1)]
+    for ply in range(plies + 1):
+        start = time.time()
+        next_frontier = []
+        for b, player in frontier:
+            key = zobrist_hash(b, player)
+            moves = legal_moves(b, player)
+            if key in entries or not moves:
+                continue
+            minimax_ai.new_search()
+            score, move = minimax_ai.root_search(b, player, depth, workers)
+            entries[key] = (move, score)
+            next_player = 1 if player == 2 else 2
+            next_frontier.extend((play(b, player, sq), next_player) for sq in iter_squares(moves))
+        print("ply {}: {} positions in {:.1f}s".format(ply, len(frontier), time.time() - start))
+        frontier = next_frontier
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an Othello opening book")
+    parser.add_argument("-b", default=8, type=int, help="Board size (default 8x8)")
+    parser.add_argument("--plies", default=4, type=int, help="Plies from the initial board (default 4)")
+    parser.add_argument("--depth", default=6, type=int, help="Search depth per position (default 6)")
+    parser.add_argument("--workers", default=1, type=int, help="Processes for the search (default 1)")
+    parser.add_argument("-o", help="Output file (default book_<size>x<size>.bin next to this script)")
+    args = parser.parse_args()
+
+    entries = build_book(args.b, args.plies, args.depth, args.workers)
+    path = args.o or book_path(args.b)
+    write_book(path, args.b, entries)
+    print("Wrote {} positions to {}".format(len(entries), path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Move ordering for the alpha-beta player.
+
+Alpha-beta prunes the most when the best move is searched first. Moves are
+tried in this order:
+
+1. the hash move, the best move stored in the transposition table, which is
+   the principal variation move of the previous iteration,
+2. the two killer moves of the ply, which recently caused cutoffs in sibling
+   positions,
+3. the rest by history score (how often and how deep a square caused
+   cutoffs) plus a static square value: corners first, X-squares last.
+
+Plies are identified by the number of discs on the board, which grows by one
+with every move, so killers stay valid across iterations and moves.
+"""
+from functools import lru_cache
+
+from othello_bitboard import iter_squares, popcount
+from evaluation import tables
+
+HASH_SCORE = 1 << 30
+KILLER_SCORE = 1 << 29
+
+
+@lru_cache(maxsize=None)
+def static_scores(size):
+    """
+    Return the static ordering score of every square, from the square weights
+    of the evaluation.
+    """
+    weights, _, _, _ = tables(size)
+    scores = [0] * (size * size)
+    for w, m in weights:
+        for sq in iter_squares(m):
+            scores[sq] = w
+    return scores
+
+
+class MoveOrdering(object):
+
+    def __init__(self):
+        self.killers = {}
+        self.history = {}
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """
+        Age the history scores, so that older searches weigh less.
+        """
+        for table in self.history.values():
+            for sq in range(len(table)):
+                table[sq] >>= 1
+
+    def order(self, state, player, moves, hash_move=None):
+        """
+        Return the squares of the legal-move mask moves, best first.
+        """
+        size = state.size
+        static = static_scores(size)
+        history = self.history.get((size, player))
+        killers = self.killers.get((size, popcount(state.dark | state.light)), ())
+        scored = []
+        for sq in iter_squares(moves):
+            if sq == hash_move:
+                score = HASH_SCORE
+            elif sq in killers:
+                score = KILLER_SCORE
+            else:
+                score = static[sq] + (history[sq] if history else 0)
+            scored.append((score, -sq))
+        scored.sort(reverse=True)
+        return [-sq for _, sq in scored]
+
+    def cutoff(self, state, player, sq, depth, index):
+        """
+        Record that square sq, tried index-th, caused a cutoff with depth
+        plies left.
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        size = state.size
+        ply = (size, popcount(state.dark | state.light))
+        killers = self.killers.get(ply, ())
+        if sq not in killers:
+            self.killers[ply] = (sq,) + killers[:1]
+        history = self.history.get((size, player))
+        if history is None:
+            history = self.history[(size, player)] = [0] * (size * size)
+        history[sq] += depth * depth
+
+    def first_move_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def report(self):
+        return "Cutoffs: {}, first move {:.1%}".format(self.cutoffs, self.first_move_rate())
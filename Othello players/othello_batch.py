@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Batched Othello engine that advances many games with one call.
+
+Two representations are supported:
+
+* stacked NumPy boards of shape (N, size, size), for any board size, using
+  shifted boolean planes, and
+* arrays of 64-bit bitboards (one dark and one light uint64 per game), for
+  boards up to 8x8, using the same shift-and-mask scheme as othello_bitboard.
+
+players is an (N,) array holding the color to move in each game. A game is
+finished when the player to move has no legal move, as in play_game. Moves
+are flat square indices (j * size + i), -1 for finished games.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from othello_shared import DIRECTIONS
+from othello_bitboard import geometry
+
+ONE = np.uint64(1)
+
+
+def _pick(mask, rng):
+    """
+    Choose a uniformly random True entry in every row of the boolean (N, M)
+    mask. Returns the column indices, -1 for rows without any True entry.
+    """
+    counts = mask.sum(axis=1)
+    ranks = np.floor(rng.random(len(mask)) * counts)
+    picked = np.argmax(np.cumsum(mask, axis=1) > ranks[:, None], axis=1)
+    picked[counts == 0] = -1
+    return picked
+
+
+def _push(a, xdir, ydir):
+    """
+    Move the contents of the stacked (N, size, size) boolean arrays one
+    square in direction (xdir, ydir). Squares pushed off the board are lost.
+    """
+    size = a.shape[1]
+    out = np.zeros_like(a)
+    out[:, max(ydir, 0):size + min(ydir, 0), max(xdir, 0):size + min(xdir, 0)] = \
+        a[:, max(-ydir, 0):size + min(-ydir, 0), max(-xdir, 0):size + min(-xdir, 0)]
+    return out
+
+
+def _sides(boards, players):
+    player = players[:, None, None]
+    return boards == player, (boards != player) & (boards != 0)
+
+
+####################################################
+# Stacked NumPy boards
+
+def legal_moves(boards, players):
+    """
+    Return the (N, size, size) boolean legal-move masks of the stacked boards.
+    """
+    own, opp = _sides(boards, players)
+    empty = boards == 0
+    moves = np.zeros_like(empty)
+    for xdir, ydir in DIRECTIONS:
+        t = _push(own, xdir, ydir) & opp
+        for _ in range(boards.shape[1] - 3):
+            t |= _push(t, xdir, ydir) & opp
+        moves |= _push(t, xdir, ydir) & empty
+    return moves
+
+
+def play_moves(boards, players, moves):
+    """
+    Return new boards with players[n] playing square moves[n] on boards[n].
+    Games whose move is -1 are copied unchanged.
+    """
+    n, size = boards.shape[:2]
+    own, opp = _sides(boards, players)
+    move = np.zeros(n * size * size, dtype=bool)
+    move[(np.arange(n) * size * size + moves)[moves >= 0]] = True
+    move = move.reshape(boards.shape)
+    changed = move.copy()
+    for xdir, ydir in DIRECTIONS:
+        x = _push(move, xdir, ydir)
+        line = np.zeros_like(move)
+        closed = np.zeros(n, dtype=bool)
+        for _ in range(size - 1):
+            closed |= (x & own).any(axis=(1, 2))
+            x &= opp
+            line |= x
+            x = _push(x, xdir, ydir)
+        changed |= line & closed[:, None, None]
+    return np.where(changed, players[:, None, None], boards).astype(boards.dtype)
+
+
+def step(boards, players, rng=None):
+    """
+    Play one uniformly random legal move in every unfinished game.
+
+    Returns:
+        boards (ndarray): The new (N, size, size) boards
+        players (ndarray): The colors to move next
+        moves (ndarray): The squares played, -1 where the game was finished
+        finished (ndarray): Boolean, True for the games that were finished
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    mask = legal_moves(boards, players).reshape(len(boards), -1)
+    moves = _pick(mask, rng)
+    finished = moves < 0
+    boards = play_moves(boards, players, moves)
+    players = np.where(finished, players, 3 - players)
+    return boards, players, moves, finished
+
+
+def playout(boards, players, rng=None):
+    """
+    Play all games to the end with random moves.
+    Returns the (N,) utilities (dark discs minus light discs).
+    """
+    players = np.asarray(players)
+    while True:
+        boards, players, _, finished = step(boards, players, rng)
+        if finished.all():
+            break
+    flat = boards.reshape(len(boards), -1)
+    return (flat == 1).sum(axis=1) - (flat == 2).sum(axis=1)
+
+
+####################################################
+# Arrays of 64-bit bitboards
+
+def pack(boards):
+    """
+    Convert stacked NumPy boards (size <= 8) into dark and light uint64 arrays.
+    """
+    flat = boards.reshape(len(boards), -1)
+    weights = ONE << np.arange(flat.shape[1], dtype=np.uint64)
+    dark = np.bitwise_or.reduce(np.where(flat == 1, weights, 0).astype(np.uint64), axis=1)
+    light = np.bitwise_or.reduce(np.where(flat == 2, weights, 0).astype(np.uint64), axis=1)
+    return dark, light
+
+
+def unpack(dark, light, size, dtype=float):
+    """
+    Convert dark and light uint64 arrays back into stacked NumPy boards.
+    """
+    shifts = np.arange(size * size, dtype=np.uint64)
+    boards = ((dark[:, None] >> shifts) & ONE).astype(dtype)
+    boards += 2 * ((light[:, None] >> shifts) & ONE).astype(dtype)
+    return boards.reshape(len(dark), size, size)
+
+
+def _geometry64(size):
+    if size > 8:
+        raise ValueError("64-bit bitboards only support boards up to 8x8")
+    full, _, left, right = geometry(size)
+    return (np.uint64(full),
+            tuple((np.uint64(s), np.uint64(m)) for s, m in left),
+            tuple((np.uint64(s), np.uint64(m)) for s, m in right))
+
+
+def move_masks(own, opp, size):
+    """
+    Return the uint64 legal-move masks for the side owning own in every game.
+    """
+    full, left, right = _geometry64(size)
+    empty = full & ~(own | opp)
+    moves = np.zeros_like(own)
+    steps = range(size - 3)
+    for s, m in left:
+        t = ((own & m) << s) & opp
+        for _ in steps:
+            t |= ((t & m) << s) & opp
+        moves |= ((t & m) << s) & empty
+    for s, m in right:
+        t = ((own & m) >> s) & opp
+        for _ in steps:
+            t |= ((t & m) >> s) & opp
+        moves |= ((t & m) >> s) & empty
+    return moves
+
+
+def flip_masks(own, opp, move, size):
+    """
+    Return the uint64 masks of discs flipped when own plays the one-bit
+    masks move (0 for no move).
+    """
+    _, left, right = _geometry64(size)
+    flipped = np.zeros_like(own)
+    for shift, directions in ((np.left_shift, left), (np.right_shift, right)):
+        for s, m in directions:
+            x = shift(move & m, s)
+            line = np.zeros_like(own)
+            closed = np.zeros(len(own), dtype=bool)
+            for _ in range(size - 1):
+                closed |= (x & own) != 0
+                x &= opp
+                line |= x
+                x = shift(x & m, s)
+            flipped |= np.where(closed, line, 0).astype(np.uint64)
+    return flipped
+
+
+def step_bitboards(dark, light, players, size, rng=None):
+    """
+    Play one uniformly random legal move in every unfinished game stored as
+    uint64 bitboards. Returns (dark, light, players, moves, finished) like
+    step.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    black = players == 1
+    own = np.where(black, dark, light)
+    opp = np.where(black, light, dark)
+    legal = move_masks(own, opp, size)
+    bits = ((legal[:, None] >> np.arange(size * size, dtype=np.uint64)) & ONE).astype(bool)
+    moves = _pick(bits, rng)
+    finished = moves < 0
+    move = np.where(finished, 0, ONE << np.maximum(moves, 0).astype(np.uint64)).astype(np.uint64)
+    flipped = flip_masks(own, opp, move, size)
+    own = own | flipped | move
+    opp = opp & ~flipped
+    dark = np.where(black, own, opp)
+    light = np.where(black, opp, own)
+    players = np.where(finished, players, 3 - players)
+    return dark, light, players, moves, finished
+
+
+def playout_bitboards(dark, light, players, size, rng=None):
+    """
+    Play all bitboard games to the end with random moves.
+    Returns the (N,) utilities (dark discs minus light discs).
+    """
+    players = np.asarray(players)
+    while True:
+        dark, light, players, _, finished = step_bitboards(dark, light, players, size, rng)
+        if finished.all():
+            break
+    shifts = np.arange(size * size, dtype=np.uint64)
+    dark_count = ((dark[:, None] >> shifts) & ONE).sum(axis=1).astype(int)
+    light_count = ((light[:, None] >> shifts) & ONE).sum(axis=1).astype(int)
+    return dark_count - light_count
+
+
+def initial_boards(n, size):
+    boards = np.zeros((n, size, size))
+    i = size // 2 - 1
+    boards[:, i, i] = 2
+    boards[:, i + 1, i + 1] = 2
+    boards[:, i + 1, i] = 1
+    boards[:, i, i + 1] = 1
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched random playout benchmark")
+    parser.add_argument("-n", default=1000, type=int, help="Number of games (default 1000)")
+    parser.add_argument("-b", default=8, type=int, help="Board size (default 8x8)")
+    parser.add_argument("--seed", default=0, type=int, help="Random seed")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    boards = initial_boards(args.n, args.b)
+    players = np.ones(args.n, dtype=int)
+
+    start = time.time()
+    utilities = playout(boards, players, rng)
+    elapsed = time.time() - start
+    print("arrays:    {} games in {:.3f}s, {:.0f} games/s, dark wins {}".format(
+        args.n, elapsed, args.n / elapsed, (utilities > 0).sum()))
+
+    if args.b <= 8:
+        dark, light = pack(boards)
+        start = time.time()
+        utilities = playout_bitboards(dark, light, players, args.b, rng)
+        elapsed = time.time() - start
+        print("bitboards: {} games in {:.3f}s, {:.0f} games/s, dark wins {}".format(
+            args.n, elapsed, args.n / elapsed, (utilities > 0).sum()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Bitboard rules engine for Othello.
+
+A position is stored as two integer masks, one per color. Square (i, j)
+(column i, row j) on a board of dimension d is bit j * d + i, so the layout
+matches the row-major order of the NumPy boards used by the game manager.
+Python integers are unbounded, so every board size works with the same code.
+
+The module offers two APIs:
+
+* a native one working on Board tuples and square indices
+  (legal_moves, play, score, utility, ...), used by the search code, and
+* a drop-in one with the exact signatures of othello_shared
+  (find_lines, get_possible_moves, play_move, get_score, compute_utility),
+  which accepts and returns NumPy boards.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+Board = namedtuple("Board", ["dark", "light", "size"])
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(x):
+        return bin(x).count("1")
+
+
+@lru_cache(maxsize=None)
+def geometry(size):
+    """
+    Return the shift tables for a board of the given dimension.
+
+    Returns:
+        full (int): Mask with one bit per square
+        directions (tuple): Eight (shift, premask) pairs, in the same order as
+            othello_shared.find_lines walks them. A positive shift moves bits
+            left, a negative one right. The premask clears the squares that
+            would wrap around an edge, so no mask is needed after the shift.
+        left, right (tuple): The same pairs split by shift sign
+    """
+    full = (1 << size * size) - 1
+    first_col = sum(1 << (row * size) for row in range(size))
+    last_col = first_col << (size - 1)
+    first_row = (1 << size) - 1
+    last_row = first_row << (size * (size - 1))
+    to_east = full & ~last_col
+    to_west = full & ~first_col
+    to_south = full & ~last_row
+    to_north = full & ~first_row
+    directions = ((size, to_south),                  # (0, 1)
+                  (size + 1, to_south & to_east),    # (1, 1)
+                  (1, to_east),                      # (1, 0)
+                  (-(size - 1), to_north & to_east), # (1, -1)
+                  (-size, to_north),                 # (0, -1)
+                  (-(size + 1), to_north & to_west), # (-1, -1)
+                  (-1, to_west),                     # (-1, 0)
+                  (size - 1, to_south & to_west))    # (-1, 1)
+    left = tuple((s, m) for s, m in directions if s > 0)
+    right = tuple((-s, m) for s, m in directions if s < 0)
+    return full, directions, left, right
+
+
+def move_mask(own, opp, size):
+    """
+    Return the mask of all squares where the side owning own can play.
+    """
+    full, _, left, right = geometry(size)
+    empty = full & ~(own | opp)
+    moves = 0
+    steps = range(size - 3)
+    for s, m in left:
+        t = ((own & m) << s) & opp
+        for _ in steps:
+            t |= ((t & m) << s) & opp
+        moves |= ((t & m) << s) & empty
+    for s, m in right:
+        t = ((own & m) >> s) & opp
+        for _ in steps:
+            t |= ((t & m) >> s) & opp
+        moves |= ((t & m) >> s) & empty
+    return moves
+
+
+def flip_mask(own, opp, sq, size):
+    """
+    Return the mask of opponent discs flipped when own plays on square sq.
+    """
+    _, _, left, right = geometry(size)
+    move = 1 << sq
+    flipped = 0
+    for s, m in left:
+        line = 0
+        x = (move & m) << s
+        while x & opp:
+            line |= x
+            x = (x & m) << s
+        if x & own:
+            flipped |= line
+    for s, m in right:
+        line = 0
+        x = (move & m) >> s
+        while x & opp:
+            line |= x
+            x = (x & m) >> s
+        if x & own:
+            flipped |= line
+    return flipped
+
+
+def iter_squares(mask):
+    """
+    Yield the indices of the set bits of mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def square(i, j, size):
+    """
+    Return the bit index of column i and row j. Coordinates may be NumPy
+    integers (from np.argwhere), which would overflow in shifts.
+    """
+    return int(j) * size + int(i)
+
+
+def coordinates(sq, size):
+    """
+    Return the (column, row) tuple of square sq.
+    """
+    return sq % size, sq // size
+
+
+def squares(mask, size):
+    """
+    Return the squares of mask in the order othello_shared.get_possible_moves
+    reports them (column by column, top to bottom).
+    """
+    return sorted(iter_squares(mask), key=lambda sq: (sq % size, sq))
+
+
+####################################################
+# Native API
+
+def initial_board(size):
+    i = size // 2 - 1
+    dark = (1 << square(i, i + 1, size)) | (1 << square(i + 1, i, size))
+    light = (1 << square(i, i, size)) | (1 << square(i + 1, i + 1, size))
+    return Board(dark, light, size)
+
+
+def from_array(board):
+    """
+    Convert a NumPy board (0 empty, 1 dark, 2 light) into a Board.
+    """
+    flat = np.asarray(board).ravel()
+    dark = int.from_bytes(np.packbits(flat == 1, bitorder="little").tobytes(), "little")
+    light = int.from_bytes(np.packbits(flat == 2, bitorder="little").tobytes(), "little")
+    return Board(dark, light, board.shape[0])
+
+
+def _unpack(mask, size):
+    cells = size * size
+    raw = np.frombuffer(mask.to_bytes((cells + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder="little")[:cells].astype(bool)
+
+
+def to_array(b, dtype=float):
+    """
+    Convert a Board into a NumPy board.
+    """
+    flat = np.zeros(b.size * b.size, dtype=dtype)
+    flat[_unpack(b.dark, b.size)] = 1
+    flat[_unpack(b.light, b.size)] = 2
+    return flat.reshape(b.size, b.size)
+
+
+def sides(b, player):
+    """
+    Return the (own, opp) masks of b from the point of view of player.
+    """
+    if player == 1:
+        return b.dark, b.light
+    return b.light, b.dark
+
+
+def legal_moves(b, player):
+    """
+    Return the mask of the squares player can play on.
+    """
+    if player == 1:
+        return move_mask(b.dark, b.light, b.size)
+    return move_mask(b.light, b.dark, b.size)
+
+
+def play(b, player, sq):
+    """
+    Return the Board after player plays on square sq. The move is not checked.
+    """
+    if player == 1:
+        flipped = flip_mask(b.dark, b.light, sq, b.size)
+        return Board(b.dark | flipped | (1 << sq), b.light & ~flipped, b.size)
+    flipped = flip_mask(b.light, b.dark, sq, b.size)
+    return Board(b.dark & ~flipped, b.light | flipped | (1 << sq), b.size)
+
+
+def score(b):
+    return popcount(b.dark), popcount(b.light)
+
+
+def utility(b):
+    return popcount(b.dark) - popcount(b.light)
+
+
+####################################################
+# Drop-in API with the othello_shared signatures
+
+def find_lines(board, i, j, player):
+    """
+    Find all the uninterrupted lines of stones that would be captured if player
+    plays column i and row j.
+    """
+    size = board.shape[0]
+    own, opp = sides(from_array(board), player)
+    _, directions, _, _ = geometry(size)
+    lines = []
+    for s, m in directions:
+        line = []
+        x = 1 << square(i, j, size)
+        while True:
+            x = (x & m) << s if s > 0 else (x & m) >> -s
+            if not x & opp:
+                break
+            line.append(coordinates(x.bit_length() - 1, size))
+        if x & own and line:
+            lines.append(line)
+    return lines
+
+
+def get_possible_moves(board, player):
+    """
+    Return a list of all possible (column,row) tuples that player can play on
+    the current board.
+    """
+    size = board.shape[0]
+    moves = legal_moves(from_array(board), player)
+    return [coordinates(sq, size) for sq in squares(moves, size)]
+
+
+def play_move(board, player, i, j):
+    size = board.shape[0]
+    own, opp = sides(from_array(board), player)
+    sq = square(i, j, size)
+    changed = flip_mask(own, opp, sq, size) | (1 << sq)
+    new_board = np.copy(board)
+    new_board.reshape(-1)[_unpack(changed, size)] = player
+    return new_board
+
+
+def get_score(board):
+    return score(from_array(board))
+
+
+def compute_utility(board):
+    return utility(from_array(board))
@@ -6,11 +6,17 @@ players.
 
 Credit: Dr. Daniel Bauer
 """
+import ast
+import importlib
+import os
 import sys
+import shlex
 import subprocess
+import time
 import numpy as np
 from threading import Timer
 from othello_shared import find_lines, get_possible_moves, play_move, get_score
+from protocol import parse_introduction, choose_protocol, color_line, encode_board, NEWGAME
 
 class InvalidMoveError(RuntimeError):
     pass
@@ -33,14 +39,24 @@ class AiPlayerInterface(Player):
 
     TIMEOUT = 10
 
-    def __init__(self, filename, color):
+    def __init__(self, filename, color, persistent=False):
+        """
+        With persistent, an AI that supports it is not killed at the end of
+        a game but kept for the next one (see new_game).
+        """
         self.color = color
-        self.process = subprocess.Popen([sys.executable, '-u', filename], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.timed_out = False
+        # filename may carry options for the AI, e.g. "minimax_ai.py --workers 4"
+        command = [filename] if os.path.exists(filename) else shlex.split(filename)
+        self.process = subprocess.Popen([sys.executable, '-u'] + command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
         self.process.stdin.flush()
-        name = self.process.stdout.readline().decode("ASCII").strip()
+        # The AI may offer compact board encodings after its name (see protocol.py)
+        name, offered = parse_introduction(self.process.stdout.readline().decode("ASCII"))
+        self.protocol = choose_protocol(offered)
+        self.persistent = persistent and NEWGAME in offered
         print("AI introduced itself as: {}".format(name))
         self.name = name
-        self.process.stdin.write((str(color)+"\n").encode("ASCII"))
+        self.process.stdin.write((color_line(color, self.protocol)+"\n").encode("ASCII"))
         self.process.stdin.flush()
 
     def timeout(self): 
@@ -52,7 +68,7 @@ class AiPlayerInterface(Player):
         white_score, dark_score = get_score(manager.board)
         self.process.stdin.write("SCORE {} {}\n".format(white_score, dark_score).encode("ASCII"))
         self.process.stdin.flush()
-        self.process.stdin.write("{}\n".format(str(tuple(map(tuple, manager.board)))).encode("ASCII"))
+        self.process.stdin.write("{}\n".format(encode_board(manager.board, self.protocol)).encode("ASCII"))
         self.process.stdin.flush()
 
         timer = Timer(AiPlayerInterface.TIMEOUT, lambda: self.timeout())
@@ -73,7 +89,111 @@ class AiPlayerInterface(Player):
     def kill(self, manager):
         white_score, dark_score = get_score(manager.board)
         self.process.stdin.write("FINAL {} {}\n".format(white_score, dark_score).encode("ASCII"))
-        self.process.kill() 
+        if self.persistent and not self.timed_out and self.process.poll() is None:
+            self.process.stdin.flush()
+            timer = Timer(AiPlayerInterface.TIMEOUT, lambda: self.timeout())
+            timer.start()
+            self.process.stdout.readline()      # The AI acknowledges FINAL
+            timer.cancel()
+        else:
+            self.process.kill()
+
+    def new_game(self, color):
+        """
+        Start another game with a persistent AI, which keeps its warm caches.
+
+        Returns:
+            reused (bool): False if the AI process cannot be reused
+        """
+        if not self.persistent or self.timed_out or self.process.poll() is not None:
+            return False
+        self.process.stdin.write("NEWGAME {}\n".format(color).encode("ASCII"))
+        self.process.stdin.flush()
+        self.color = color
+        return True
+
+    def close(self):
+        self.process.kill()
+
+
+class InProcessPlayer(Player):
+    """
+    Player calling an AI's move function directly, in this process:
+    select_move(board, color, **options) returns the (column,row) move for
+    the ndarray board. Nothing has to start up and caches stay warm from
+    game to game, but the move time is not enforced.
+
+    The caches are the player's own: if the AI module lists its module-level
+    search state in PLAYER_STATE (name -> factory), each player gets fresh
+    objects, swapped in while it moves, so players with different settings
+    in one process do not reuse each other's results.
+    """
+
+    def __init__(self, select_move, color, name=None, **options):
+        self.select_move = select_move
+        self.color = color
+        self.name = name or select_move.__module__
+        self.options = options
+        self.module = sys.modules[select_move.__module__]
+        self.state = {name: factory() for name, factory in getattr(self.module, "PLAYER_STATE", {}).items()}
+
+    def get_move(self, manager):
+        saved = {name: getattr(self.module, name) for name in self.state}
+        for name, value in self.state.items():
+            setattr(self.module, name, value)
+        try:
+            return self.select_move(manager.board, self.color, **self.options)
+        finally:
+            for name, value in saved.items():
+                setattr(self.module, name, value)
+
+    def kill(self, manager):
+        pass
+
+    def new_game(self, color):
+        self.color = color
+        return True
+
+    def close(self):
+        pass
+
+
+# Move functions of the AIs that can be played in-process, by name
+IN_PROCESS_AIS = {
+    "minimax": ("minimax_ai", "minimax", "Minimax AI"),
+    "mcts": ("mcts_ai", "mcts", "MCTS AI"),
+    "random": ("randy_ai", "random_move", "Randy"),
+}
+
+
+def in_process_player(spec, color):
+    """
+    Create an InProcessPlayer from spec, an IN_PROCESS_AIS name optionally
+    followed by keyword options of its move function, e.g.
+    "mcts rollouts=500 rave=300". MCTS searches for the same time as in its
+    own process unless rollouts or time_limit is given.
+    """
+    fields = spec.split()
+    module_name, function, name = IN_PROCESS_AIS[fields[0]]
+    module = importlib.import_module(module_name)
+    options = {}
+    for field in fields[1:]:
+        key, _, value = field.partition("=")
+        options[key] = ast.literal_eval(value)
+    if fields[0] == "mcts" and "rollouts" not in options and "time_limit" not in options:
+        options["time_limit"] = module.TIME_FRACTION * AiPlayerInterface.TIMEOUT
+    return InProcessPlayer(getattr(module, function), color, name, **options)
+
+
+def make_player(spec, color, persistent=False):
+    """
+    Create the player for a command line spec: "inproc:<name> [options]"
+    for an in-process AI (see in_process_player), otherwise an AI script
+    with its options for AiPlayerInterface.
+    """
+    if spec.startswith("inproc:"):
+        return in_process_player(spec[len("inproc:"):], color)
+    return AiPlayerInterface(spec, color, persistent)
 
 
 class OthelloGameManager(object):
@@ -107,28 +227,53 @@ class OthelloGameManager(object):
         return get_possible_moves(self.board, self.current_player)
 
 
-def play_game(game, player1, player2):
+def play_game(game, player1, player2, verbose=True, on_move=None):
+    """
+    Play game to the end, player1 being dark. A player that times out,
+    sends a malformed reply or plays an illegal move forfeits the game.
 
+    Args:
+        verbose (bool): Print the moves and the result
+        on_move: Called as on_move(color, seconds) after every move with the
+            time the player took
+
+    Returns:
+        dark_score, light_score (int): Final disc counts
+        timed_out: Color of the player who forfeited, or None
+    """
     players = [None, player1, player2]
+    timed_out = None
 
     while True: 
         player_obj = players[game.current_player]
         possible_moves = game.get_possible_moves() 
         if not possible_moves: 
-            p1score, p2score = get_score(game.board)
-            print("FINAL: {} (dark) {}:{} {} (light)".format(player1.name, p1score, p2score, player2.name))
-            player1.kill(game)
-            player2.kill(game)
             break 
         else: 
             color = "dark" if game.current_player == 1 else "light"
             try: 
+                start = time.time()
                 i, j = player_obj.get_move(game)
-                print("{} ({}) plays {},{}".format(player_obj.name, color, i, j))
+                if on_move is not None:
+                    on_move(game.current_player, time.time() - start)
+                if verbose:
+                    print("{} ({}) plays {},{}".format(player_obj.name, color, i, j))
                 game.play(i,j)
             except AiTimeoutError:
-                print("{} ({}) timed out!".format(player_obj.name, color))
-                print("FINAL: {} (dark) {}:{} {} (light)".format(player_obj.name, p1score, p2score, player2.name))
-                player1.kill(game)
-                player2.kill(game)
+                if verbose:
+                    print("{} ({}) timed out!".format(player_obj.name, color))
+                timed_out = game.current_player
+                break
+            except (ValueError, InvalidMoveError) as e:
+                if verbose:
+                    print("{} ({}) forfeits: {}".format(player_obj.name, color, e))
+                player_obj.timed_out = True     # Not to be reused
+                timed_out = game.current_player
                 break
+
+    p1score, p2score = get_score(game.board)
+    if verbose:
+        print("FINAL: {} (dark) {}:{} {} (light)".format(player1.name, p1score, p2score, player2.name))
+    player1.kill(game)
+    player2.kill(game)
+    return p1score, p2score, timed_out
@@ -6,12 +6,17 @@ This module contains a simple graphical user interface for Othello.
 Credit: Dr. Daniel Bauer
 """
 import argparse
+import numpy as np
 from tkinter import *
 from tkinter import scrolledtext
 
-from othello_game import OthelloGameManager, AiPlayerInterface, Player, InvalidMoveError, AiTimeoutError
+from othello_game import OthelloGameManager, AiPlayerInterface, InProcessPlayer, Player, InvalidMoveError, \
+    AiTimeoutError, make_player
 from othello_shared import get_possible_moves, get_score
 
+# Players that move by themselves, as opposed to a human clicking
+AI_PLAYERS = (AiPlayerInterface, InProcessPlayer)
+
 class OthelloGui(object):
 
     def __init__(self, game_manager, player1, player2):
@@ -38,6 +43,7 @@ class OthelloGui(object):
         self.score_label.pack(side="top")
         self.canvas.pack()
         self.text.pack()
+        self.draw_grid()
         self.draw_board()
 
     def get_position(self, x, y):
@@ -55,7 +61,7 @@ class OthelloGui(object):
             self.draw_board()
             if not get_possible_moves(self.game.board, self.game.current_player):
                 self.shutdown("Game Over")
-            elif isinstance(self.players[self.game.current_player], AiPlayerInterface):
+            elif isinstance(self.players[self.game.current_player], AI_PLAYERS):
                 self.root.unbind("<Button-1>")
                 self.root.after(100,lambda: self.ai_move())
         except InvalidMoveError:
@@ -64,9 +70,9 @@ class OthelloGui(object):
     def shutdown(self, text):
         self.move_label["text"] = text 
         self.root.unbind("<Button-1>")
-        if isinstance(self.players[1], AiPlayerInterface): 
+        if isinstance(self.players[1], AI_PLAYERS): 
             self.players[1].kill(self.game)
-        if isinstance(self.players[2], AiPlayerInterface): 
+        if isinstance(self.players[2], AI_PLAYERS): 
             self.players[2].kill(self.game)
  
     def ai_move(self):
@@ -80,7 +86,7 @@ class OthelloGui(object):
             self.draw_board()
             if not get_possible_moves(self.game.board, self.game.current_player):
                 self.shutdown("Game Over")
-            elif isinstance(self.players[self.game.current_player], AiPlayerInterface):
+            elif isinstance(self.players[self.game.current_player], AI_PLAYERS):
                 self.root.after(1, lambda: self.ai_move())
             else: 
                 self.root.bind("<Button-1>", lambda e: self.mouse_pressed(e))
@@ -88,7 +94,7 @@ class OthelloGui(object):
             self.shutdown("Game Over, {} lost (timeout)".format(player_obj.name))
 
     def run(self):
-        if isinstance(self.players[1], AiPlayerInterface):
+        if isinstance(self.players[1], AI_PLAYERS):
             self.root.after(10, lambda: self.ai_move())
         else: 
             self.root.bind("<Button-1>", lambda e: self.mouse_pressed(e))
@@ -96,7 +102,6 @@ class OthelloGui(object):
         self.canvas.mainloop()
 
     def draw_board(self):
-        self.draw_grid()
         self.draw_disks()
         player = "Dark" if self.game.current_player == 1 else "Light"
         self.move_label["text"] = player
@@ -107,25 +112,38 @@ class OthelloGui(object):
         self.text.see("end")
  
     def draw_grid(self):
-        for i in range(self.height):
-            for j in range(self.width):
+        """
+        Create the canvas items, once: the squares and a hidden disk on each
+        of them. draw_disks then only changes the disks of squares that
+        changed, so the number of items and the cost of a redraw stay the
+        same however many moves are played.
+        """
+        self.disks = {}
+        for i in range(self.width):
+            for j in range(self.height):
                 self.canvas.create_rectangle(i*self.cell_size + self.offset, j*self.cell_size + self.offset,
                                              (i+1)*self.cell_size + self.offset, (j+1)*self.cell_size + self.offset,
                                              fill="dark green")
-       
-    def draw_disk(self, i, j, color):
+                self.disks[i, j] = self.draw_disk(i, j)
+        # Board shown by the disks
+        self.shown = np.zeros((self.height, self.width))
+
+    def draw_disk(self, i, j):
         x = i * self.cell_size + self.offset
         y = j * self.cell_size + self.offset
         padding = 2
-        self.canvas.create_oval(x+padding, y+padding, x+self.cell_size-padding, y+self.cell_size-padding, fill=color)
-        
+        return self.canvas.create_oval(x+padding, y+padding, x+self.cell_size-padding, y+self.cell_size-padding,
+                                       state="hidden")
+
     def draw_disks(self):
-        for i in range(self.height): 
-            for j in range(self.width):
-                if self.game.board[i, j] == 1:
-                    self.draw_disk(j, i, "black")
-                elif self.game.board[i, j] == 2:
-                    self.draw_disk(j, i, "white")
+        board = self.game.board
+        for j, i in zip(*np.nonzero(board != self.shown)):
+            if board[j, i] == 0:
+                self.canvas.itemconfigure(self.disks[i, j], state="hidden")
+            else:
+                self.canvas.itemconfigure(self.disks[i, j], state="normal",
+                                          fill="black" if board[j, i] == 1 else "white")
+        self.shown = board.copy()
 
 
 def main():
@@ -134,10 +152,10 @@ def main():
         description="Othello",
     )
     parser.add_argument(
-        "-p1", help="AI agent for player 1"
+        "-p1", help="AI agent for player 1 (a script, or inproc:minimax, inproc:mcts, inproc:random)"
     )
     parser.add_argument(
-        "-p2", help="AI agent for player 2"
+        "-p2", help="AI agent for player 2 (a script, or inproc:minimax, inproc:mcts, inproc:random)"
     )
     parser.add_argument(
         "-b", default=4, type=int, help="Board size (default 4x4)"
@@ -147,11 +165,11 @@ def main():
     if args.p1 is None:
         p1 = Player(1)
     else:
-        p1 = AiPlayerInterface(args.p1, 1)
+        p1 = make_player(args.p1, 1)
     if args.p2 is None:
         p2 = Player(2)
     else:
-        p2 = AiPlayerInterface(args.p2, 2)
+        p2 = make_player(args.p2, 2)
 
     game = OthelloGameManager(dimension=args.b)
     gui = OthelloGui(game, p1, p2)
@@ -6,8 +6,52 @@ and by the each AI player.
 
 Credit: Dr. Daniel Bauer
 """
+from functools import lru_cache
+
 import numpy as np
 
+DIRECTIONS = [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+
+
+@lru_cache(maxsize=None)
+def get_rays(size):
+    """
+    Return an (8, size-1, size*size) array of flat board indices. Entry
+    [d, k, c] is the square k+1 steps away from square c in direction d, or
+    size*size (a padding square that is always empty) past the edge of the
+    board. Squares are numbered row by row, as in board.ravel().
+    """
+    cells = size * size
+    row, col = np.divmod(np.arange(cells), size)
+    steps = np.arange(1, size)[:, None]
+    rays = np.full((len(DIRECTIONS), size - 1, cells), cells)
+    for d, (xdir, ydir) in enumerate(DIRECTIONS):
+        u = col + xdir * steps
+        v = row + ydir * steps
+        inside = (0 <= u) & (u < size) & (0 <= v) & (v < size)
+        rays[d][inside] = (v * size + u)[inside]
+    return rays
+
+
+def scan_lines(board, player):
+    """
+    Look along all eight directions from every square at once.
+
+    Returns:
+        rays (ndarray): The (8, size-1, size*size) rays that were scanned
+        run (ndarray): (8, size*size) number of opponent discs that player
+            would capture in each direction, 0 if the line is not closed
+    """
+    size = board.shape[0]
+    rays = get_rays(size)
+    line = np.append(board.ravel(), 0)[rays]
+    captured = (line != player) & (line != 0)
+    run = np.argmin(captured, axis=1)
+    end = np.take_along_axis(line, run[:, None, :], axis=1)[:, 0, :]
+    run[end != player] = 0
+    return rays, run
+
+
 def find_lines(board, i, j, player):
     """
     Find all the uninterrupted lines of stones that would be captured if player
@@ -43,14 +87,42 @@ def get_possible_moves(board, player):
     Return a list of all possible (column,row) tuples that player can play on
     the current board. 
     """
-    result = []
-    for i in range(board.shape[0]):
-        for j in range(board.shape[0]):
-            if board[j, i] == 0:
-                lines = find_lines(board, i, j, player)
-                if lines: 
-                    result.append((i, j))
-    return result
+    return legal_move_mask(board, player)[0]
+
+
+def legal_move_mask(board, player):
+    """
+    Compute all legal moves of player with whole-board array operations.
+
+    Returns:
+        moves (list): (column,row) tuples, in the same order as
+            get_possible_moves
+        mask (ndarray): Boolean array, mask[j, i] is True if player can play
+            column i and row j
+    """
+    _, run = scan_lines(board, player)
+    mask = ((run > 0).any(axis=0) & (board.ravel() == 0)).reshape(board.shape)
+    moves = [(i, j) for i, j in np.argwhere(mask.T).tolist()]
+    return moves, mask
+
+
+def flip_masks(board, player):
+    """
+    Compute the discs flipped by every move of player at once.
+
+    Returns:
+        flips (ndarray): Boolean array of shape (size, size, size, size),
+            flips[j, i] is the mask of discs flipped if player plays column i
+            and row j. It is all False for illegal moves.
+    """
+    size = board.shape[0]
+    cells = size * size
+    rays, run = scan_lines(board, player)
+    run[:, board.ravel() != 0] = 0
+    d, k, c = np.nonzero(np.arange(size - 1)[None, :, None] < run[:, None, :])
+    flips = np.zeros((cells, cells + 1), dtype=bool)
+    flips[c, rays[d, k, c]] = True
+    return flips[:, :cells].reshape(size, size, size, size)
 
 
 def play_move(board, player, i, j):
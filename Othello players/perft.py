@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Perft: move-generation benchmark and correctness check of the rules engines.
+
+perft(position, depth) is the number of positions reached after exactly
+depth moves, playing every legal move at every ply. As in the game
+manager, a game ends when the side to move has no legal move, so there are
+no passes and finished games add nothing. Every move is played, including
+at the last ply, so the counts exercise both move generation and
+play_move.
+
+Each rules backend counts the same stored positions:
+
+    shared     othello_shared.get_possible_moves / play_move (find_lines)
+    dropin     the othello_shared signatures of othello_bitboard
+    bitboard   othello_bitboard Boards (legal_moves / play)
+    batch      othello_batch stacked arrays, one ply for all positions at once
+    batch64    othello_batch uint64 bitboards (boards up to 8x8)
+
+The counts are compared with REFERENCE, and the results can be written as
+JSON and compared with an earlier run to catch speed regressions. The
+exit status is 1 if a count is wrong or a backend got slower.
+
+Usage: python perft.py -b 4 6 8 --depth 5 -o perft.json --baseline old.json
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import othello_batch
+import othello_bitboard
+import othello_shared
+from othello_bitboard import Board, initial_board, legal_moves, play, iter_squares, sides, to_array
+
+# Stored positions by board size: name -> (dark, light, player to move).
+# Apart from the start, they come from seeded random games.
+POSITIONS = {
+    4: {"start": None, "ply4": (0x24e, 0x421, 1)},
+    6: {"start": None, "ply8": (0x1830c000, 0x820c2100, 1), "ply14": (0x46904, 0x38738412, 1)},
+    8: {"start": None, "ply10": (0x1828400000, 0x101f0010080400, 1),
+        "ply20": (0x80400018370870e0, 0x700408700000, 1)},
+}
+
+# perft counts for depth 1, 2, ... of every stored position. The 8x8
+# start agrees with the published Othello perft up to depth 8; at depth 9
+# it is 24 lower, since the published one plays on after a pass.
+REFERENCE = {
+    (4, "start"): (4, 12, 44, 128, 420, 1232, 3524, 8716, 18448, 31444, 35096),
+    (4, "ply4"): (4, 7, 19, 44, 94, 164, 187, 151, 0),
+    (6, "start"): (4, 12, 56, 244, 1364, 7604, 47740, 308716, 2114800),
+    (6, "ply8"): (6, 35, 232, 1693, 12237, 93478, 693685, 5232205),
+    (6, "ply14"): (6, 37, 248, 1529, 10075, 58808, 372183, 1990212, 11589445),
+    (8, "start"): (4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005264),
+    (8, "ply10"): (8, 44, 405, 2925, 28718, 245148, 2606356),
+    (8, "ply20"): (13, 151, 1685, 19557, 210894, 2494946),
+}
+
+# Depth searched when none is given
+DEFAULT_DEPTH = {4: 7, 6: 5, 8: 4}
+
+
+def get_position(size, name):
+    """
+    Returns:
+        b (Board): The stored position
+        player (int): Color to move
+    """
+    stored = POSITIONS.get(size, {}).get(name)
+    if stored is None:
+        return initial_board(size), 1
+    dark, light, player = stored
+    return Board(dark, light, size), player
+
+
+####################################################
+# Backends: each counts the leaves below Board b with player to move
+
+def perft_shared(b, player, depth, rules=othello_shared):
+    def count(board, player, depth):
+        if depth == 0:
+            return 1
+        return sum(count(rules.play_move(board, player, i, j), 3 - player, depth - 1)
+                   for i, j in rules.get_possible_moves(board, player))
+    return count(to_array(b), player, depth)
+
+
+def perft_dropin(b, player, depth):
+    return perft_shared(b, player, depth, othello_bitboard)
+
+
+def perft_bitboard(b, player, depth):
+    if depth == 0:
+        return 1
+    return sum(perft_bitboard(play(b, player, sq), 3 - player, depth - 1)
+               for sq in iter_squares(legal_moves(b, player)))
+
+
+def perft_batch(b, player, depth):
+    boards = to_array(b, np.int8)[None]
+    for ply in range(depth):
+        players = np.full(len(boards), player if ply % 2 == 0 else 3 - player)
+        parents, moves = np.nonzero(othello_batch.legal_moves(boards, players).reshape(len(boards), -1))
+        boards = othello_batch.play_moves(boards[parents], players[parents], moves)
+    return len(boards)
+
+
+def perft_batch64(b, player, depth):
+    own, opp = (np.array([mask], dtype=np.uint64) for mask in sides(b, player))
+    shifts = np.arange(b.size * b.size, dtype=np.uint64)
+    for _ in range(depth):
+        legal = othello_batch.move_masks(own, opp, b.size)
+        parents, squares = np.nonzero((legal[:, None] >> shifts) & othello_batch.ONE)
+        move = othello_batch.ONE << squares.astype(np.uint64)
+        own, opp = own[parents], opp[parents]
+        flipped = othello_batch.flip_masks(own, opp, move, b.size)
+        own, opp = opp & ~flipped, own | flipped | move
+    return len(own)
+
+
+# name -> (perft function, largest board size)
+BACKENDS = {
+    "shared": (perft_shared, None),
+    "dropin": (perft_dropin, None),
+    "bitboard": (perft_bitboard, None),
+    "batch": (perft_batch, None),
+    "batch64": (perft_batch64, 8),
+}
+
+
+def run(backends, sizes, depth=None, min_time=0.2):
+    """
+    Count every stored position of the given sizes with every backend,
+    repeating each count for at least min_time seconds.
+
+    Returns:
+        records (list): One dict per backend and position: backend, size,
+            position, depth, count, expected (None if not in REFERENCE),
+            ok, seconds (per count) and rate (positions/s)
+    """
+    records = []
+    for size in sizes:
+        d = depth or DEFAULT_DEPTH.get(size, 3)
+        for name in POSITIONS.get(size, {"start": None}):
+            b, player = get_position(size, name)
+            reference = REFERENCE.get((size, name), ())
+            expected = reference[d - 1] if d <= len(reference) else None
+            for backend in backends:
+                function, max_size = BACKENDS[backend]
+                if max_size is not None and size > max_size:
+                    continue
+                runs = 0
+                start = time.time()
+                while True:
+                    count = function(b, player, d)
+                    runs += 1
+                    elapsed = time.time() - start
+                    if elapsed >= min_time:
+                        break
+                seconds = elapsed / runs
+                records.append(dict(backend=backend, size=size, position=name, depth=d, count=count,
+                                     expected=expected, ok=expected is None or count == expected,
+                                     seconds=seconds, rate=count / seconds if seconds else 0.0))
+    return records
+
+
+def compare(records, baseline, tolerance):
+    """
+    Return the records at least tolerance times slower than the same
+    measurement in baseline, as (record, baseline rate) pairs.
+    """
+    def key(r):
+        return r["backend"], r["size"], r["position"], r["depth"]
+    rates = {key(r): r["rate"] for r in baseline}
+    return [(r, rates[key(r)]) for r in records
+            if key(r) in rates and r["rate"] * tolerance < rates[key(r)]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft benchmark and correctness check of the rules backends")
+    parser.add_argument("-b", nargs="+", default=[4, 6, 8], type=int, help="Board sizes (default 4 6 8)")
+    parser.add_argument("--depth", type=int, help="Plies (default {})".format(
+        ", ".join("{} for {}x{}".format(d, s, s) for s, d in sorted(DEFAULT_DEPTH.items()))))
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS),
+                        help="Backends to run (default all)")
+    parser.add_argument("--min-time", default=0.2, type=float, help="Seconds to repeat each count (default 0.2)")
+    parser.add_argument("-o", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare speeds with")
+    parser.add_argument("--tolerance", default=1.25, type=float,
+                        help="Report a regression when a rate is this many times below the baseline (default 1.25)")
+    args = parser.parse_args()
+
+    records = run(args.backends, args.b, args.depth, args.min_time)
+    print("{:<9} {:>5} {:<7} {:>5} {:>10} {:>6} {:>12}".format(
+        "backend", "size", "pos", "depth", "count", "check", "positions/s"))
+    for r in records:
+        check = "-" if r["expected"] is None else "ok" if r["ok"] else "WRONG"
+        print("{:<9} {:>5} {:<7} {:>5} {:>10} {:>6} {:>12.0f}".format(
+            r["backend"], "{0}x{0}".format(r["size"]), r["position"], r["depth"], r["count"], check, r["rate"]))
+    failed = not all(r["ok"] for r in records)
+    for r in records:
+        if not r["ok"]:
+            print("{backend}: perft {depth} of {size}x{size} {position} is {count}, expected {expected}".format(**r))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(records, json.load(f)["results"], args.tolerance)
+        for r, rate in slower:
+            print("{backend} {size}x{size} {position} depth {depth}: {rate:.0f} positions/s, baseline {0:.0f}".format(
+                rate, **r))
+        failed = failed or bool(slower)
+        print("{} regressions against {}".format(len(slower), args.baseline))
+
+    if args.o:
+        with open(args.o, "w") as f:
+            json.dump({"python": sys.version.split()[0], "numpy": np.__version__, "time": time.time(),
+                       "results": records}, f, indent=1)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Board encodings of the game manager / AI protocol.
+
+The original protocol sends every board as the text of a tuple of tuples
+of floats, which the AI has to parse as a Python literal. Newer AIs can
+offer compact encodings at the handshake:
+
+1. The AI introduces itself with its name, optionally followed by a tab
+   and the encodings it understands: "MCTS AI\\tPROTOCOLS bits1".
+2. The manager answers with the color, followed by the chosen encoding if
+   it is not the text one: "1 bits1". AIs without an offer get a bare "1",
+   as before, and a bare color means text to new AIs as well.
+
+Encodings:
+
+    text   ((0.0, 1.0, ...), ...) rows of the board as a tuple literal
+    bits1  "BOARD <size> <dark> <light>", the bitboards of othello_bitboard
+           (bit j * size + i for column i, row j) in hexadecimal
+
+The SCORE/FINAL lines and the move replies are the same for all encodings.
+
+An AI may also offer "newgame" to serve several games in a row. It then
+answers FINAL with an empty line, and may get "NEWGAME <color>" next, after
+which a new game starts with the same encoding.
+
+Usage: python protocol.py -b 8 16 -n 200   (per-move I/O latency of each encoding)
+"""
+import argparse
+import ast
+import time
+
+import numpy as np
+from six.moves import input
+
+from othello_bitboard import Board, from_array, to_array
+
+TEXT = "text"
+# Compact encodings, most preferred first
+PROTOCOLS = ("bits1",)
+# Offered by AIs that can play another game after FINAL
+NEWGAME = "newgame"
+
+
+def introduction(name, protocols=PROTOCOLS + (NEWGAME,)):
+    """
+    Return the first line an AI prints: its name and the encodings and
+    features it offers.
+    """
+    if not protocols:
+        return name
+    return "{}\tPROTOCOLS {}".format(name, ",".join(protocols))
+
+
+def parse_introduction(line):
+    """
+    Returns:
+        name (str): Name of the AI
+        offered (list): Encodings and features offered by the AI, empty for old AIs
+    """
+    name, _, offer = line.strip().partition("\t")
+    fields = offer.split()
+    if len(fields) == 2 and fields[0] == "PROTOCOLS":
+        return name, fields[1].split(",")
+    return name, []
+
+
+def choose_protocol(offered):
+    """
+    Return the most preferred encoding offered, or TEXT.
+    """
+    for protocol in PROTOCOLS:
+        if protocol in offered:
+            return protocol
+    return TEXT
+
+
+def color_line(color, protocol):
+    return str(color) if protocol == TEXT else "{} {}".format(color, protocol)
+
+
+def parse_color(line):
+    """
+    Returns:
+        color (int): 1 for dark, 2 for light
+        protocol (str): Encoding chosen by the manager
+    """
+    fields = line.split()
+    return int(fields[0]), fields[1] if len(fields) > 1 else TEXT
+
+
+def encode_board(board, protocol):
+    """
+    Return the line (without newline) sending the ndarray board.
+    """
+    if protocol == TEXT:
+        return str(tuple(map(tuple, board.tolist())))
+    b = from_array(board)
+    return "BOARD {} {:x} {:x}".format(b.size, b.dark, b.light)
+
+
+def decode_board(line, protocol):
+    """
+    Return the Board (bitboards) sent in line. Raises ValueError if a
+    bitboard line is malformed, or its discs overlap or lie off the board.
+    """
+    if protocol == TEXT:
+        return from_array(np.array(ast.literal_eval(line)))
+    tag, size, dark, light = line.split()
+    if tag != "BOARD":
+        raise ValueError("Expected a board, got {!r}".format(line))
+    b = Board(int(dark, 16), int(light, 16), int(size))
+    if b.size < 1 or b.dark < 0 or b.light < 0 or b.dark & b.light or (b.dark | b.light) >> (b.size * b.size):
+        raise ValueError("Invalid {0}x{0} board {1!r}".format(b.size, line))
+    return b
+
+
+def read_board(protocol):
+    return decode_board(input(), protocol)
+
+
+####################################################
+def run_echo(protocols):
+    """
+    AI that answers every board with "0 0" after decoding it, for measuring
+    the I/O of the encodings.
+    """
+    print(introduction("Echo", protocols))
+    _, protocol = parse_color(input())
+    while True:
+        status = input().split()[0]
+        if status == "FINAL":
+            return
+        to_array(read_board(protocol))
+        print("0 0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the board encodings of the AI protocol")
+    parser.add_argument("-b", nargs="+", default=[8, 16], type=int, help="Board sizes (default 8 16)")
+    parser.add_argument("-n", default=200, type=int, help="Moves per measurement (default 200)")
+    parser.add_argument("--echo", action="store_true", help="Run as an echo AI")
+    parser.add_argument("--text", action="store_true", help="With --echo, offer no compact encoding")
+    args = parser.parse_args()
+    if args.echo:
+        run_echo(() if args.text else PROTOCOLS)
+        return
+
+    from othello_game import OthelloGameManager, AiPlayerInterface
+
+    for size in args.b:
+        for name, command in ((TEXT, "protocol.py --echo --text"), ("bits1", "protocol.py --echo")):
+            game = OthelloGameManager(size)
+            player = AiPlayerInterface(command, 1)
+            player.get_move(game)
+            start = time.time()
+            for _ in range(args.n):
+                player.get_move(game)
+            elapsed = time.time() - start
+            player.kill(game)
+            line = encode_board(game.board, player.protocol)
+            print("{0}x{0} {1}: {2:.0f} us per move, {3} bytes per board".format(
+                size, name, elapsed / args.n * 1e6, len(line) + 1))
+
+
+if __name__ == "__main__":
+    main()
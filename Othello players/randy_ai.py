@@ -10,9 +10,16 @@ Credit: Dr. Daniel Bauer
 
 import random
 import time
-import numpy as np
 from six.moves import input
-from othello_shared import get_possible_moves
+from othello_bitboard import get_possible_moves, to_array
+from protocol import introduction, parse_color, read_board
+
+
+def random_move(board, color):
+    """
+    Return a random legal (column,row) move, without select_move's pause.
+    """
+    return random.choice(get_possible_moves(board, color))
 
 
 def select_move(board, color):
@@ -21,8 +28,7 @@ def select_move(board, color):
     The return value is a tuple of integers (i,j), where
     i is the column and j is the row on the board.  
     """
-    moves = get_possible_moves(board, color)
-    i, j = random.choice(moves)
+    i, j = random_move(board, color)
     time.sleep(0.1)
     return i, j
 
@@ -34,19 +40,22 @@ def run_ai():
     Then it repeatedly receives the current score and current board state
     until the game is over. 
     """
-    print("Randy")          # First line is the name of this AI
-    color = int(input())    # 1 for dark (first), 2 for light (second)
+    print(introduction("Randy"))            # First line is the name of this AI
+    color, protocol = parse_color(input())  # 1 for dark (first), 2 for light (second)
 
     while True:
         # Read in the current game status, for example:
-        # "SCORE 2 2" or "FINAL 33 31" if the game is over.
+        # "SCORE 2 2" or "FINAL 33 31" if the game is over,
+        # then possibly "NEWGAME 2" to play another game as light.
         next_input = input()
-        status, dark_score_s, light_score_s = next_input.strip().split()
+        status = next_input.split()[0]
 
-        if status == "FINAL":
-            print 
+        if status == "NEWGAME":
+            color = int(next_input.split()[1])
+        elif status == "FINAL":
+            print()
         else:
-            board = np.array(eval(input()))
+            board = to_array(read_board(protocol))
             movei, movej = select_move(board, color)
             print("{} {}".format(movei, movej)) 
 
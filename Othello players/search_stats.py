@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Per-move search statistics of the AI players.
+
+The searches count as they go (nodes, leaves, cutoffs, rollouts...) with
+plain integer additions, at most one per node or rollout, so the counters
+are always on. A SearchStats collects the time of each phase of a move
+(opening book, endgame solver, search) and the counters of the finished
+search into a one-line summary, which the AIs print to stderr with
+--stats. stdout only carries the game protocol.
+"""
+import time
+
+
+class SearchStats(object):
+    """
+    Phase times and counters of the search of one move.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.counters = []
+        self.mark = time.time()
+
+    def phase(self, name):
+        """
+        End phase name: record the time since the previous phase ended, or
+        since the stats were created.
+        """
+        now = time.time()
+        self.phases.append((name, now - self.mark))
+        self.mark = now
+
+    def seconds(self, name=None):
+        """
+        Return the time of phase name, or of all phases.
+        """
+        return sum(s for n, s in self.phases if name is None or n == name)
+
+    def add(self, name, value, fmt="{}"):
+        self.counters.append((name, fmt.format(value)))
+
+    def summary(self, player):
+        counters = ", ".join("{} {}".format(name, value) for name, value in self.counters)
+        phases = ", ".join("{} {:.3f}s".format(name, s) for name, s in self.phases)
+        return "{}: {} [{}]".format(player, counters, phases)
+
+
+def rate(count, seconds):
+    return count / seconds if seconds > 0 else 0.0
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Headless Othello tournaments.
+
+Players are given as for othello_gui: an AI script with its options, or
+inproc:<name> for an in-process AI (see othello_game.in_process_player),
+which skips the process start-up and is much faster for many games.
+
+Every pairing plays each opening twice with the colors swapped. Openings
+are a few random moves from the initial board, drawn from --seed, so the
+same command plays the same games. Games run in a process pool, each
+worker keeping its players (and their caches) from game to game.
+
+Reported per player: score, per-move latency percentiles, nodes or
+rollouts per second of in-process minimax and MCTS players, and Elo
+ratings fitted to all results (Bradley-Terry), with 95% bootstrap
+confidence intervals.
+
+Usage: python tournament.py "inproc:minimax depth=2" "inproc:mcts rollouts=200" inproc:random -b 6 -n 20 --workers 4
+"""
+import argparse
+import csv
+import math
+import multiprocessing.util
+import random
+import sys
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from othello_game import OthelloGameManager, make_player, play_game
+from othello_shared import get_possible_moves, play_move
+from worker_pool import get_pool
+
+# Players of this worker process, by spec, kept between games, and closed
+# when the worker exits
+players = {}
+
+# Random games tried per opening before make_openings gives up
+OPENING_ATTEMPTS = 100
+
+
+def get_player(spec, color):
+    """
+    Return the player for spec playing color, reusing the one of an
+    earlier game if possible.
+    """
+    if not players:
+        multiprocessing.util.Finalize(None, close_players, exitpriority=10)
+    player = players.get((spec, color))
+    if player is not None and player.new_game(color):
+        return player
+    if player is not None:
+        player.close()
+    player = players[(spec, color)] = make_player(spec, color, persistent=True)
+    return player
+
+
+def close_players():
+    for player in players.values():
+        player.close()
+    players.clear()
+
+
+def search_work(player):
+    """
+    Return the nodes (minimax) or rollouts (MCTS) of the last move of an
+    in-process player, or None if they are not known or no search ran
+    (book and endgame solver moves).
+    """
+    module = getattr(getattr(player, "select_move", None), "__module__", None)
+    if module == "minimax_ai":
+        return sys.modules[module].nodes or None    # A search visits at least the root
+    if module == "mcts_ai":
+        last_search = sys.modules[module].last_search
+        return last_search[0] if last_search is not None else None
+    return None
+
+
+def make_openings(size, count, plies, seed):
+    """
+    Return count openings of plies random moves from the initial board, as
+    lists of (column,row) moves. Raises ValueError if random games rarely or
+    never last plies moves with a move left to play.
+    """
+    if not 0 <= plies < size * size - 4:
+        raise ValueError("openings of {} plies do not fit a {}x{} board".format(plies, size, size))
+    rng = random.Random(seed)
+    openings = []
+    for _ in range(OPENING_ATTEMPTS * count):
+        if len(openings) == count:
+            break
+        board = OthelloGameManager(size).board
+        player = 1
+        moves = []
+        for _ in range(plies):
+            possible = get_possible_moves(board, player)
+            if not possible:
+                break
+            move = rng.choice(possible)
+            moves.append(move)
+            board = play_move(board, player, *move)
+            player = 1 if player == 2 else 2
+        if len(moves) == plies and get_possible_moves(board, player):
+            openings.append(moves)
+    if len(openings) < count:
+        raise ValueError("found {} of {} openings of {} plies".format(len(openings), count, plies))
+    return openings
+
+
+def play_one(dark, light, size, opening, seed):
+    """
+    Play one game in a worker process.
+
+    Returns:
+        record (dict): Players, scores, timeout, and the move times and
+            search work of each color
+    """
+    random.seed(seed)
+    game = OthelloGameManager(size)
+    for i, j in opening:
+        game.play(i, j)
+    player1 = get_player(dark, 1)
+    player2 = get_player(light, 2)
+    times = {1: [], 2: []}
+    work = {1: [0, 0.0], 2: [0, 0.0]}    # nodes or rollouts, and the time they took
+
+    def on_move(color, seconds):
+        times[color].append(seconds)
+        units = search_work(player1 if color == 1 else player2)
+        if units is not None:
+            work[color][0] += units
+            work[color][1] += seconds
+
+    dark_score, light_score, timed_out = play_game(game, player1, player2, verbose=False, on_move=on_move)
+    return dict(dark=dark, light=light, dark_score=dark_score, light_score=light_score,
+                timed_out=timed_out, times=times, work=work)
+
+
+def schedule(specs, mode, openings):
+    """
+    Return the (dark, light, opening) games of the tournament: every pair
+    in round robin, the first player against each other one in a gauntlet.
+    """
+    if mode == "gauntlet":
+        pairs = [(specs[0], other) for other in specs[1:]]
+    else:
+        pairs = [(a, b) for n, a in enumerate(specs) for b in specs[n + 1:]]
+    games = []
+    for a, b in pairs:
+        for opening in openings:
+            games.append((a, b, opening))
+            games.append((b, a, opening))
+    return games
+
+
+def game_score(record):
+    """
+    Return the score of the dark player: 1 for a win, 0.5 for a draw.
+    """
+    if record["timed_out"] is not None:
+        return 0.0 if record["timed_out"] == 1 else 1.0
+    if record["dark_score"] == record["light_score"]:
+        return 0.5
+    return 1.0 if record["dark_score"] > record["light_score"] else 0.0
+
+
+def fit_elo(results, n, iterations=200):
+    """
+    Fit Bradley-Terry strengths to results, a list of (i, j, score of i)
+    between players 0..n-1, with one virtual draw per pairing to keep
+    players without wins or losses finite.
+
+    Returns:
+        elo (ndarray): Ratings with mean 0
+    """
+    wins = np.zeros(n)
+    games = np.zeros((n, n))
+    for i, j, s in results:
+        wins[i] += s
+        wins[j] += 1 - s
+        games[i, j] += 1
+        games[j, i] += 1
+    played = games > 0
+    wins += 0.5 * played.sum(axis=1)
+    games += played
+    gamma = np.ones(n)
+    for _ in range(iterations):
+        gamma = wins / (games / (gamma[:, None] + gamma[None, :])).sum(axis=1)
+        gamma /= np.exp(np.log(gamma).mean())
+    return 400 * np.log10(gamma)
+
+
+def elo_intervals(results, n, samples=200, seed=0):
+    """
+    Return the 2.5 and 97.5 percentiles of the ratings over bootstrap
+    resamples of the games.
+    """
+    rng = np.random.default_rng(seed)
+    fits = []
+    for _ in range(samples):
+        picked = rng.integers(len(results), size=len(results))
+        fits.append(fit_elo([results[k] for k in picked], n))
+    return np.percentile(fits, 2.5, axis=0), np.percentile(fits, 97.5, axis=0)
+
+
+def report(specs, records, elapsed):
+    index = {spec: n for n, spec in enumerate(specs)}
+    results = [(index[r["dark"]], index[r["light"]], game_score(r)) for r in records]
+    elo = fit_elo(results, len(specs))
+    low, high = elo_intervals(results, len(specs))
+    moves = sum(len(r["times"][1]) + len(r["times"][2]) for r in records)
+    print("{} games, {} moves in {:.1f}s: {:.1f} games/s".format(len(records), moves, elapsed, len(records) / elapsed))
+    print("{:<28} {:>6} {:>7} {:>15} {:>8} {:>8} {:>8} {:>8} {:>12}".format(
+        "player", "games", "score", "elo (95% CI)", "p50 ms", "p90 ms", "p99 ms", "max ms", "work/s"))
+    for n, spec in enumerate(specs):
+        score = count = 0
+        times = []
+        units = seconds = 0
+        for r, (i, j, s) in zip(records, results):
+            for color, player, points in ((1, i, s), (2, j, 1 - s)):
+                if player == n:
+                    score += points
+                    count += 1
+                    times.extend(r["times"][color])
+                    units += r["work"][color][0]
+                    seconds += r["work"][color][1]
+        ms = np.percentile(times, [50, 90, 99, 100]) * 1000 if times else [math.nan] * 4
+        rate = "{:.0f}".format(units / seconds) if seconds else "n/a"
+        print("{:<28} {:>6} {:>6.1f}% {:>+5.0f} [{:+.0f},{:+.0f}] {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>12}".format(
+            spec[:28], count, 100 * score / count if count else 0, elo[n], low[n], high[n],
+            ms[0], ms[1], ms[2], ms[3], rate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Othello tournament")
+    parser.add_argument("players", nargs="+", help="Player specs, e.g. inproc:minimax or \"mcts_ai.py --rave 300\"")
+    parser.add_argument("--mode", choices=("roundrobin", "gauntlet"), default="roundrobin",
+                        help="All pairs, or the first player against each other one (default roundrobin)")
+    parser.add_argument("-b", default=6, type=int, help="Board size (default 6x6)")
+    parser.add_argument("-n", default=10, type=int, help="Openings per pairing, each played with both colors (default 10)")
+    parser.add_argument("--plies", default=2, type=int, help="Random moves of each opening (default 2)")
+    parser.add_argument("--seed", default=0, type=int, help="Seed of the openings and games")
+    parser.add_argument("--workers", default=1, type=int, help="Processes playing games (default 1)")
+    parser.add_argument("-o", help="Write one CSV row per game to this file")
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error("at least two players are needed")
+
+    try:
+        openings = make_openings(args.b, args.n, args.plies, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    games = schedule(args.players, args.mode, openings)
+    executor = get_pool(args.workers)
+    start = time.time()
+    futures = [executor.submit(play_one, dark, light, args.b, opening, args.seed * 1000003 + n)
+               for n, (dark, light, opening) in enumerate(games)]
+    records = []
+    for done, future in enumerate(as_completed(futures), 1):
+        records.append(future.result())
+        sys.stderr.write("\r{}/{} games".format(done, len(futures)))
+    sys.stderr.write("\n")
+    executor.shutdown()
+    report(args.players, records, time.time() - start)
+
+    if args.o:
+        with open(args.o, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["dark", "light", "dark_score", "light_score", "timed_out", "dark_moves", "light_moves"])
+            for r in records:
+                writer.writerow([r["dark"], r["light"], r["dark_score"], r["light_score"],
+                                 r["timed_out"] or "", len(r["times"][1]), len(r["times"][2])])
+
+
+if __name__ == "__main__":
+    main()
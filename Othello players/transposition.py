@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Zobrist hashing and a fixed-size transposition table for the search players.
+
+Keys are 64-bit integers. Every (square, color) pair and the side to move
+get a random key; the hash of a position is the XOR of the keys of its
+discs, so it can be updated with a few XORs after each move.
+"""
+import random
+from functools import lru_cache
+
+import numpy as np
+
+from othello_bitboard import iter_squares
+
+EXACT = 0
+LOWER = 1   # value is a lower bound (the search failed high)
+UPPER = 2   # value is an upper bound (the search failed low)
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(size):
+    """
+    Return the Zobrist keys of a board size as (dark, light, flip, side),
+    where flip[sq] == dark[sq] ^ light[sq]. The keys are seeded by the size
+    so that every process computes the same hashes.
+    """
+    rng = random.Random(size)
+    dark = [rng.getrandbits(64) for _ in range(size * size)]
+    light = [rng.getrandbits(64) for _ in range(size * size)]
+    flip = [d ^ l for d, l in zip(dark, light)]
+    return dark, light, flip, rng.getrandbits(64)
+
+
+def zobrist_hash(b, player):
+    """
+    Compute the hash of Board b with player to move from scratch.
+    """
+    dark, light, _, side = zobrist_keys(b.size)
+    key = side if player == 2 else 0
+    for sq in iter_squares(b.dark):
+        key ^= dark[sq]
+    for sq in iter_squares(b.light):
+        key ^= light[sq]
+    return key
+
+
+def zobrist_update(key, size, player, sq, flipped):
+    """
+    Return the hash after player plays square sq and flips the discs in the
+    mask flipped. The side to move is switched as well.
+    """
+    dark, light, flip, side = zobrist_keys(size)
+    key ^= (dark if player == 1 else light)[sq] ^ side
+    for f in iter_squares(flipped):
+        key ^= flip[f]
+    return key
+
+
+class TranspositionTable(object):
+    """
+    Fixed-size hash table of search results.
+
+    Entries live in NumPy arrays sized from a memory budget, so the table never
+    grows. Each bucket has two slots: a depth-preferred slot, only replaced by
+    deeper results or results from a newer search, and an always-replace slot.
+    """
+
+    ENTRY_BYTES = 17    # key 8, value 4, move 2, depth 1, flag 1, age 1
+
+    def __init__(self, megabytes=16):
+        buckets = 1
+        while 2 * buckets * 2 * self.ENTRY_BYTES <= megabytes * 2 ** 20:
+            buckets *= 2
+        self.mask = buckets - 1
+        slots = 2 * buckets
+        self.keys = np.zeros(slots, dtype=np.uint64)
+        self.values = np.zeros(slots, dtype=np.int32)
+        self.moves = np.full(slots, -1, dtype=np.int16)
+        self.depths = np.full(slots, -1, dtype=np.int8)
+        self.flags = np.zeros(slots, dtype=np.int8)
+        self.ages = np.zeros(slots, dtype=np.int8)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def __len__(self):
+        return int((self.depths >= 0).sum())
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.keys, self.values, self.moves,
+                                      self.depths, self.flags, self.ages))
+
+    def new_search(self):
+        """
+        Mark the entries stored so far as stale, so they are replaced first.
+        """
+        self.age = (self.age + 1) % 128
+
+    def clear(self):
+        self.depths[:] = -1
+        self.probes = self.hits = self.stores = self.overwrites = 0
+
+    def probe(self, key):
+        """
+        Look up a position.
+
+        Returns:
+            entry (tuple): (value, flag, depth, move) or None if not stored
+        """
+        self.probes += 1
+        slot = (key & self.mask) << 1
+        for s in (slot, slot + 1):
+            if self.keys[s] == key and self.depths[s] >= 0:
+                self.hits += 1
+                return (int(self.values[s]), int(self.flags[s]),
+                        int(self.depths[s]), int(self.moves[s]))
+        return None
+
+    def store(self, key, value, flag, depth, move):
+        """
+        Store a search result. move is a square index or None.
+        """
+        self.stores += 1
+        s = (key & self.mask) << 1
+        if self.keys[s] != key and self.depths[s] >= 0 and \
+                self.ages[s] == self.age and self.depths[s] > depth:
+            s += 1
+        if self.depths[s] >= 0 and self.keys[s] != key:
+            self.overwrites += 1
+        self.keys[s] = key
+        self.values[s] = value
+        self.flags[s] = flag
+        self.depths[s] = min(depth, 127)
+        self.moves[s] = -1 if move is None else move
+        self.ages[s] = self.age
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def report(self):
+        return "TT: {} probes, {} hits ({:.1%}), {} stores, {} overwrites, {}/{} slots used, {:.1f} MB".format(
+            self.probes, self.hits, self.hit_rate(), self.stores, self.overwrites,
+            len(self), len(self.keys), self.nbytes() / 2 ** 20)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+Process pool shared by the parallel searches of the AI players.
+
+The pool is created on first use and kept for the life of the AI process,
+so the workers stay warm between moves.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+pool = None
+pool_workers = 0
+
+
+def init_worker(parent):
+    """
+    Make a worker exit once the AI process is gone. The game manager kills the
+    AI without notice at the end of the game, so the pool is never shut down.
+    """
+    def watch():
+        while os.getppid() == parent:
+            time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def get_pool(workers):
+    """
+    Return the process pool, (re)created with the given number of workers.
+    """
+    global pool, pool_workers
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.shutdown()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(os.getpid(),))
+        pool_workers = workers
+    return pool